@@ -0,0 +1,24 @@
+import os
+
+# Cards accepted by one bulk create/update/delete request, all of them are written in one transaction
+CARD_BULK_MAX_ITEMS = int(os.getenv("CARD_BULK_MAX_ITEMS", "5000"))
+
+# Card fields a deck read can be projected to and the largest page a client can ask for
+CARD_FIELDS = ("card_uuid", "card_front", "card_back", "last_learned", "next_learned", "stage")
+DECK_PAGE_MAX_LIMIT = int(os.getenv("DECK_PAGE_MAX_LIMIT", "1000"))
+
+# Leitner boxes: days until a card of the given stage is due again, a wrong answer moves it back to stage 0
+REVIEW_INTERVAL_DAYS = tuple(float(days) for days in os.getenv("REVIEW_INTERVAL_DAYS", "0,1,2,4,8,16,32,64").split(","))
+DUE_CARDS_MAX_LIMIT = int(os.getenv("DUE_CARDS_MAX_LIMIT", "200"))
+
+# "sync" commits every review result before answering, "write_behind" (opt-in) buffers them and flushes in batches
+REVIEW_DURABILITY = os.getenv("REVIEW_DURABILITY", "sync")
+REVIEW_FLUSH_INTERVAL = float(os.getenv("REVIEW_FLUSH_INTERVAL", "1.0"))
+REVIEW_FLUSH_MAX_PENDING = int(os.getenv("REVIEW_FLUSH_MAX_PENDING", "500"))
+# Results the buffer holds at most, past that they are written synchronously again
+REVIEW_BUFFER_MAX_RESULTS = int(os.getenv("REVIEW_BUFFER_MAX_RESULTS", "10000"))
+
+# Deck export/import: rows fetched per cursor round-trip, cards per multi-row INSERT and the longest accepted line
+DECK_EXPORT_BATCH_SIZE = int(os.getenv("DECK_EXPORT_BATCH_SIZE", "1000"))
+DECK_IMPORT_BATCH_SIZE = int(os.getenv("DECK_IMPORT_BATCH_SIZE", "1000"))
+DECK_IMPORT_MAX_LINE_BYTES = int(os.getenv("DECK_IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
\ No newline at end of file
@@ -1,10 +1,14 @@
-from langchain_groq import ChatGroq
+import os
 
-chat_model = ChatGroq(
-    temperature=0.3,
-    model="llama3-8b-8192",
-    api_key="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",
-)
+DEFAULT_AI_MODEL = "llama3-8b-8192"
+CHAT_MODEL_TEMPERATURE = 0.3
+# There is no fallback key, the model pool refuses to build clients without one
+CHAT_MODEL_API_KEY = os.getenv("GROQ_API_KEY")
+
+# Keep-alive connections shared by all model clients and how many prebuilt chains are kept
+CHAT_MODEL_MAX_CONNECTIONS = int(os.getenv("CHAT_MODEL_MAX_CONNECTIONS", "20"))
+CHAT_MODEL_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("CHAT_MODEL_MAX_KEEPALIVE_CONNECTIONS", "10"))
+CHAIN_REGISTRY_SIZE = int(os.getenv("CHAIN_REGISTRY_SIZE", "128"))
 
 system_template = (
     "You are an expert tutor. "
@@ -14,3 +18,44 @@ system_template = (
     "Respond with only the flashcard, nothing else. "
     "All content should be in English."
 )
+
+# Formatted with the number of cards before it is handed to the prompt template
+batch_system_template = (
+    "You are an expert tutor. "
+    "Create exactly {card_count} flashcards based on the given topic. "
+    "Every flashcard must strictly follow the format 'Question ; Answer' and stand on its own line. "
+    "Do not number the flashcards and do not repeat a question. "
+    "The output should only contain the flashcards in this format, without any additional text, explanations, or introductions. "
+    "Respond with only the flashcards, nothing else. "
+    "All content should be in English."
+)
+
+# Appended when a request is split into several concurrent batches, so they do not all come back with the same cards
+batch_part_template = (
+    " The flashcards are created in {batch_count} parallel parts, this is part {batch_number} of {batch_count}. "
+    "Divide the topic into {batch_count} distinct aspects and only cover aspect number {batch_number}, "
+    "the other parts cover the remaining aspects."
+)
+
+context_template = (
+    "Use the following pieces of retrieved context to form a response."
+    "Always prioritize the context you have."
+    "If you don't know the answer then you will use your knowledge."
+    "Keep the answer concise."
+    "\n\n"
+    "{context}"
+)
+
+# Chat histories per session and deck are evicted when idle for the TTL or when the store exceeds its budget
+CHAT_HISTORY_MAX_ENTRIES = int(os.getenv("CHAT_HISTORY_MAX_ENTRIES", "1000"))
+CHAT_HISTORY_MAX_BYTES = int(os.getenv("CHAT_HISTORY_MAX_BYTES", str(64 * 1024 * 1024)))
+CHAT_HISTORY_TTL = float(os.getenv("CHAT_HISTORY_TTL", str(6 * 60 * 60)))
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "40"))
+
+# Only the newest history messages within this (estimated) token window are sent to the model
+CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "1500"))
+
+# Model answers are reused for the same model, prompt and retrieved context, similar questions match above the threshold
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 60 * 60)))
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY_THRESHOLD", "0.95"))
\ No newline at end of file
@@ -1,33 +1,46 @@
+import os
+
 from loguru import logger
-from sqlalchemy import Engine
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session as Db_session
 
-from app.model.dao.deck_model_dao import Base, Session, Deck
+from app.model.dao.deck_model_dao import Session, Deck
 
 DATABASE = {
-    "host": "localhost",
-    "database": "MemoryMaster-Backend",
-    "user": "memorymaster",
-    "password": "memorymaster",
-    "port": 5432,
+    "host": os.getenv("DATABASE_HOST", "postgres"),
+    "database": os.getenv("DATABASE_NAME", "MemoryMaster-Backend"),
+    "user": os.getenv("DATABASE_USER", "memorymaster"),
+    "password": os.getenv("DATABASE_PASSWORD", "memorymaster"),
+    "port": int(os.getenv("DATABASE_PORT", "5432")),
 }
 
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql://{DATABASE['user']}:{DATABASE['password']}@{DATABASE['host']}:{DATABASE['port']}/{DATABASE['database']}",
+)
 
-def create_tables(engine: Engine) -> None:
-    Base.metadata.drop_all(engine)
-    Base.metadata.create_all(engine)
-    logger.info("Tables dropped and created successfully!")
+# Every uvicorn worker has its own pool, so pool size plus overflow times the workers has to stay below max_connections
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "5"))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "10"))
+DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", str(30 * 60)))
+DATABASE_POOL_PRE_PING = os.getenv("DATABASE_POOL_PRE_PING", "true").lower() == "true"
+DATABASE_STATEMENT_TIMEOUT = int(os.getenv("DATABASE_STATEMENT_TIMEOUT", "15000"))
 
 
-def initialize_data(db: Db_session) -> None:
-    new_session = Session(session_uuid="1")
-    db.add(new_session)
-    db.commit()
-    db.refresh(new_session)
+# Session existence and deck ids are cached per worker, other workers only see a deleted deck after the TTL
+RESOLUTION_CACHE_SIZE = int(os.getenv("RESOLUTION_CACHE_SIZE", "10000"))
+RESOLUTION_CACHE_TTL = float(os.getenv("RESOLUTION_CACHE_TTL", "60"))
 
-    new_deck = Deck(deck_name="New Deck", session_uuid="1")
-    db.add(new_deck)
+
+def initialize_data(db: Db_session) -> None:
+    # Runs on every startup, so existing rows are left untouched
+    db.execute(insert(Session).values(session_uuid="1").on_conflict_do_nothing(index_elements=["session_uuid"]))
+    db.execute(
+        insert(Deck)
+        .values(deck_name="New Deck", session_uuid="1")
+        .on_conflict_do_nothing(index_elements=["session_uuid", "deck_name"])
+    )
     db.commit()
-    db.refresh(new_deck)
 
-    logger.info("Initial session and deck created successfully!")
\ No newline at end of file
+    logger.info("Initial session and deck ensured successfully!")
\ No newline at end of file
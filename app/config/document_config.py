@@ -0,0 +1,33 @@
+import os
+
+# Per-document artifacts (lexical index, chunks) live in one directory per document hash
+DOCUMENT_DIRECTORY = os.getenv("DOCUMENT_DIRECTORY", "app/data/documents")
+
+# Lexical indexes kept in memory, the rest is loaded from disk on demand
+LEXICAL_INDEX_CACHE_SIZE = int(os.getenv("LEXICAL_INDEX_CACHE_SIZE", "64"))
+
+# Worker threads for background document ingestion and how long finished jobs stay queryable
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+INGESTION_JOB_RETENTION = int(os.getenv("INGESTION_JOB_RETENTION", "1000"))
+INGESTION_JOB_TTL = float(os.getenv("INGESTION_JOB_TTL", "86400"))
+
+# Maps the hash of uploaded bytes to the hash of the extracted text, so repeat uploads skip the parsing
+RAW_DOCUMENT_DIRECTORY = os.getenv("RAW_DOCUMENT_DIRECTORY", "app/data/raw")
+
+# PDFs with at least this many pages are extracted in parallel by a process pool
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+
+# Streamed uploads are spooled here in chunks until their ingestion job has run
+UPLOAD_DIRECTORY = os.getenv("UPLOAD_DIRECTORY", "app/data/uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Disk budget for all per-document artifacts, least recently used documents are evicted above it
+DOCUMENT_STORE_MAX_BYTES = int(os.getenv("DOCUMENT_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+CHUNK_STORE_CACHE_SIZE = int(os.getenv("CHUNK_STORE_CACHE_SIZE", "64"))
+
+# Files attached to /generateCard are kept on disk per content hash and referenced per session and deck
+FILE_STORE_DIRECTORY = os.getenv("FILE_STORE_DIRECTORY", "app/data/files")
+FILE_STORE_MAX_BYTES = int(os.getenv("FILE_STORE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+FILE_STORE_TTL = float(os.getenv("FILE_STORE_TTL", str(7 * 24 * 60 * 60)))
+FILE_STORE_MAX_REFERENCES = int(os.getenv("FILE_STORE_MAX_REFERENCES", "10000"))
\ No newline at end of file
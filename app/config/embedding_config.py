@@ -0,0 +1,15 @@
+import os
+
+EMBEDDING_MODEL_NAME = "mixedbread-ai/mxbai-embed-large-v1"
+TRANSFORMER_DIMENSIONS = 768
+
+# On-disk cache of document chunk embeddings, the size budget decides how many vectors are kept
+EMBEDDING_CACHE_DIRECTORY = os.getenv("EMBEDDING_CACHE_DIRECTORY", "app/data/embeddings")
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Persistent chroma collections, one per session, deck and document
+VECTOR_INDEX_DIRECTORY = os.getenv("VECTOR_INDEX_DIRECTORY", "app/data/chroma")
+
+# mxbai retrieves best when queries carry this instruction, documents are embedded without it
+EMBEDDING_QUERY_PROMPT = "Represent this sentence for searching relevant passages: "
+EMBEDDING_QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "1024"))
\ No newline at end of file
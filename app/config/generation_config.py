@@ -0,0 +1,18 @@
+import os
+
+# Threads used for the blocking pipeline stages (PDF parsing, TF-IDF, sentence transformer encoding)
+GENERATION_EXECUTOR_WORKERS = int(os.getenv("GENERATION_EXECUTOR_WORKERS", "4"))
+
+# Card generations allowed to run at the same time, everything above waits in the queue
+GENERATION_MAX_CONCURRENT = int(os.getenv("GENERATION_MAX_CONCURRENT", "8"))
+GENERATION_MAX_CONCURRENT_PER_SESSION = int(os.getenv("GENERATION_MAX_CONCURRENT_PER_SESSION", "2"))
+
+# Seconds a request may wait in the queue before it is rejected
+GENERATION_QUEUE_TIMEOUT = float(os.getenv("GENERATION_QUEUE_TIMEOUT", "30"))
+
+# Upper bound of cards in one /generateCards request and how many of them are asked for per LLM round-trip
+GENERATION_MAX_CARDS = int(os.getenv("GENERATION_MAX_CARDS", "50"))
+GENERATION_CARDS_PER_REQUEST = int(os.getenv("GENERATION_CARDS_PER_REQUEST", "10"))
+
+# Events a streaming generation queues for a slow client, partial events beyond that are skipped
+GENERATION_STREAM_MAX_QUEUED_EVENTS = int(os.getenv("GENERATION_STREAM_MAX_QUEUED_EVENTS", "32"))
@@ -1,31 +1,42 @@
-import datetime
 import json
 import uuid as uuid_module
 
-from sqlalchemy.orm import Session as Db_session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession as Db_session
 from starlette.responses import JSONResponse
 
-from app.model.dao.deck_model_dao import Deck, Session, Card
-from app.model.dto.answer_model_dto import CardDTO
-from app.model.dto.request_model_dto import UpdateCardDTO
+from app.config.card_config import CARD_BULK_MAX_ITEMS
+from app.model.dto.answer_model_dto import CardDTO, CardResultDTO, BulkCardResultDTO
+from app.model.dto.request_model_dto import CreateCardDTO, UpdateCardDTO
+from app.services.resolution_service import (
+    resolve_deck, resolve_deck_cached, refresh_deck, is_foreign_key_violation,
+    insert_card, update_card, delete_card, insert_cards, update_cards, delete_cards
+)
+from app.services.review_buffer_service import review_buffer
+
+
+def bulk_card_response(results: list[CardResultDTO]) -> JSONResponse:
+    succeeded_count = sum(1 for result in results if result.status_code == 200)
+    bulk_card_result_dto = BulkCardResultDTO(
+        results=results, succeeded_count=succeeded_count, failed_count=len(results) - succeeded_count
+    )
+
+    return JSONResponse(content=json.loads(bulk_card_result_dto.model_dump_json()), status_code=200)
 
 
 class CardHandler:
 
     async def create_card_handler(self, card_back: str, card_front: str, db: Db_session, deck_name: str, session_uuid: str, last_learned: str, next_learned: str) -> JSONResponse:
 
-        existing_session = db.query(Session).filter_by(session_uuid=session_uuid).first()
-        if not existing_session:
-            return JSONResponse(content="Session not found", status_code=404)
-
-        deck = db.query(Deck).filter_by(deck_name=deck_name, session_uuid=session_uuid).first()
-        if not deck:
+        new_card = await insert_card(db, session_uuid, deck_name, str(uuid_module.uuid4()), card_front, card_back, last_learned, next_learned)
+        if not new_card:
+            # Only a failed write pays for the second query that tells the 404s apart
+            resolution = await resolve_deck(db, session_uuid, deck_name)
+            if not resolution.session_found:
+                return JSONResponse(content="Session not found", status_code=404)
             return JSONResponse(content="Deck was not found", status_code=404)
 
-        new_card = Card(card_front=card_front, card_back=card_back, deck_id= int(str(deck.id)), card_uuid=str(uuid_module.uuid4()), last_learned=last_learned, next_learned=next_learned)
-        db.add(new_card)
-        db.commit()
-        db.refresh(new_card)
+        await db.commit()
         card_dto = CardDTO(
             card_front=new_card.card_front,
             card_back=new_card.card_back,
@@ -40,33 +51,32 @@ class CardHandler:
 
     async def update_card_handler(self, session_uuid: str, deck_name: str, db: Db_session, update_card_dto: UpdateCardDTO ) -> JSONResponse:
 
-        existing_session = db.query(Session).filter_by(session_uuid=session_uuid).first()
-        if not existing_session:
-            return JSONResponse(content="Session not found", status_code=404)
-
-        deck = db.query(Deck).filter_by(deck_name=deck_name, session_uuid=session_uuid).first()
-        if not deck:
-            return JSONResponse(content="Deck not found", status_code=404)
-
-        card = db.query(Card).filter_by(card_uuid=update_card_dto.card_uuid, deck_id=deck.id).first()
+        # The update sets the schedule, a buffered review result of the card would overwrite it with the next flush
+        await review_buffer.discard(session_uuid, deck_name, [update_card_dto.card_uuid])
+        card = await update_card(
+            db, session_uuid, deck_name, update_card_dto.card_uuid,
+            card_front=update_card_dto.card_front,
+            card_back=update_card_dto.card_back,
+            last_learned=update_card_dto.last_learned,
+            next_learned=update_card_dto.next_learned,
+            stage=update_card_dto.stage,
+        )
         if not card:
+            resolution = await resolve_deck(db, session_uuid, deck_name)
+            if not resolution.session_found:
+                return JSONResponse(content="Session not found", status_code=404)
+            if not resolution.deck_id:
+                return JSONResponse(content="Deck not found", status_code=404)
             return JSONResponse(content="Card not found", status_code=404)
 
-        card.card_front = update_card_dto.card_front
-        card.card_back = update_card_dto.card_back
-        card.last_learned = update_card_dto.last_learned
-        card.next_learned = update_card_dto.next_learned
-        card.stage = update_card_dto.stage
-
-        db.commit()
-        db.refresh(card)
+        await db.commit()
         card_dto = CardDTO(
-            card_front=update_card_dto.card_front,
-            card_back=update_card_dto.card_back,
+            card_front=card.card_front,
+            card_back=card.card_back,
             card_uuid=card.card_uuid,
-            last_learned=update_card_dto.last_learned,
-            next_learned=update_card_dto.next_learned,
-            stage=update_card_dto.stage
+            last_learned=card.last_learned,
+            next_learned=card.next_learned,
+            stage=card.stage
         )
 
         return JSONResponse(content=json.loads(card_dto.model_dump_json()), status_code=200)
@@ -74,19 +84,132 @@ class CardHandler:
 
     async def delete_card_handler(self, card_uuid: str, db: Db_session, deck_name: str, session_uuid: str) -> JSONResponse:
 
-        existing_session = db.query(Session).filter_by(session_uuid=session_uuid).first()
-        if not existing_session:
+        if not await delete_card(db, session_uuid, deck_name, card_uuid):
+            resolution = await resolve_deck(db, session_uuid, deck_name)
+            if not resolution.session_found:
+                return JSONResponse(content="Session not found", status_code=404)
+            if not resolution.deck_id:
+                return JSONResponse(content="Deck not found", status_code=404)
+            return JSONResponse(content="Card not found", status_code=404)
+
+        await db.commit()
+
+        return JSONResponse(content="Card deleted successfully", status_code=200)
+
+
+    async def create_cards_handler(self, db: Db_session, deck_name: str, session_uuid: str, create_card_dtos: list[CreateCardDTO]) -> JSONResponse:
+
+        if len(create_card_dtos) > CARD_BULK_MAX_ITEMS:
+            return JSONResponse(content=f"At most {CARD_BULK_MAX_ITEMS} cards can be sent at once", status_code=413)
+
+        resolution = await resolve_deck_cached(db, session_uuid, deck_name)
+        if not resolution.session_found:
             return JSONResponse(content="Session not found", status_code=404)
+        if not resolution.deck_id:
+            return JSONResponse(content="Deck was not found", status_code=404)
 
-        deck = db.query(Deck).filter_by(deck_name=deck_name, session_uuid=session_uuid).first()
-        if not deck:
+        new_cards = []
+        if create_card_dtos:
+            card_rows = [
+                {
+                    "card_uuid": str(uuid_module.uuid4()),
+                    "card_front": create_card_dto.card_front,
+                    "card_back": create_card_dto.card_back,
+                    "last_learned": create_card_dto.last_learned,
+                    "next_learned": create_card_dto.next_learned,
+                } for create_card_dto in create_card_dtos
+            ]
+            try:
+                new_cards = await insert_cards(db, resolution.deck_id, card_rows)
+            except IntegrityError as e:
+                if not is_foreign_key_violation(e):
+                    raise
+                # The cached deck id was stale, the cards go to the deck the database knows by that name
+                await db.rollback()
+                resolution = await refresh_deck(db, session_uuid, deck_name)
+                if not resolution.session_found:
+                    return JSONResponse(content="Session not found", status_code=404)
+                if not resolution.deck_id:
+                    return JSONResponse(content="Deck was not found", status_code=404)
+                new_cards = await insert_cards(db, resolution.deck_id, card_rows)
+            await db.commit()
+
+        return bulk_card_response([
+            CardResultDTO(card_uuid=new_card.card_uuid, status_code=200, card=CardDTO(**new_card._mapping))
+            for new_card in new_cards
+        ])
+
+
+    async def update_cards_handler(self, db: Db_session, deck_name: str, session_uuid: str, update_card_dtos: list[UpdateCardDTO]) -> JSONResponse:
+
+        if len(update_card_dtos) > CARD_BULK_MAX_ITEMS:
+            return JSONResponse(content=f"At most {CARD_BULK_MAX_ITEMS} cards can be sent at once", status_code=413)
+
+        resolution = await resolve_deck_cached(db, session_uuid, deck_name)
+        if not resolution.session_found:
+            return JSONResponse(content="Session not found", status_code=404)
+        if not resolution.deck_id:
             return JSONResponse(content="Deck not found", status_code=404)
 
-        card = db.query(Card).filter_by(card_uuid=card_uuid, deck_id=deck.id).first()
-        if not card:
-            return JSONResponse(content="Card not found", status_code=404)
-
-        db.delete(card)
-        db.commit()
+        # A card sent more than once is updated once, with its last values
+        latest_updates = {update_card_dto.card_uuid: update_card_dto for update_card_dto in update_card_dtos}
+
+        updated_cards = {}
+        if latest_updates:
+            await review_buffer.discard(session_uuid, deck_name, list(latest_updates))
+            card_rows = [update_card_dto.model_dump() for update_card_dto in latest_updates.values()]
+            cards = await update_cards(db, resolution.deck_id, card_rows)
+            if not cards:
+                # Nothing matched, which is also what a stale cached deck id looks like
+                stale_deck_id = resolution.deck_id
+                resolution = await refresh_deck(db, session_uuid, deck_name)
+                if not resolution.session_found:
+                    return JSONResponse(content="Session not found", status_code=404)
+                if not resolution.deck_id:
+                    return JSONResponse(content="Deck not found", status_code=404)
+                if resolution.deck_id != stale_deck_id:
+                    cards = await update_cards(db, resolution.deck_id, card_rows)
+
+            updated_cards = {card.card_uuid: card for card in cards}
+            await db.commit()
+
+        return bulk_card_response([
+            CardResultDTO(card_uuid=update_card_dto.card_uuid, status_code=200, card=CardDTO(**updated_cards[update_card_dto.card_uuid]._mapping))
+            if update_card_dto.card_uuid in updated_cards else
+            CardResultDTO(card_uuid=update_card_dto.card_uuid, status_code=404, error="Card not found")
+            for update_card_dto in update_card_dtos
+        ])
+
+
+    async def delete_cards_handler(self, db: Db_session, deck_name: str, session_uuid: str, card_uuids: list[str]) -> JSONResponse:
+
+        if len(card_uuids) > CARD_BULK_MAX_ITEMS:
+            return JSONResponse(content=f"At most {CARD_BULK_MAX_ITEMS} cards can be sent at once", status_code=413)
+
+        resolution = await resolve_deck_cached(db, session_uuid, deck_name)
+        if not resolution.session_found:
+            return JSONResponse(content="Session not found", status_code=404)
+        if not resolution.deck_id:
+            return JSONResponse(content="Deck not found", status_code=404)
 
-        return JSONResponse(content="Card deleted successfully", status_code=200)
+        deleted_card_uuids = set()
+        if card_uuids:
+            deleted_card_uuids = await delete_cards(db, resolution.deck_id, list(set(card_uuids)))
+            if not deleted_card_uuids:
+                # Nothing matched, which is also what a stale cached deck id looks like
+                stale_deck_id = resolution.deck_id
+                resolution = await refresh_deck(db, session_uuid, deck_name)
+                if not resolution.session_found:
+                    return JSONResponse(content="Session not found", status_code=404)
+                if not resolution.deck_id:
+                    return JSONResponse(content="Deck not found", status_code=404)
+                if resolution.deck_id != stale_deck_id:
+                    deleted_card_uuids = await delete_cards(db, resolution.deck_id, list(set(card_uuids)))
+            await db.commit()
+
+        return bulk_card_response([
+            CardResultDTO(card_uuid=card_uuid, status_code=200)
+            if card_uuid in deleted_card_uuids else
+            CardResultDTO(card_uuid=card_uuid, status_code=404, error="Card not found")
+            for card_uuid in card_uuids
+        ])
\ No newline at end of file
@@ -1,86 +1,194 @@
+import asyncio
+import datetime
+import hashlib
 import json
+from typing import Optional
+
+from fastapi.responses import ORJSONResponse
+from loguru import logger
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession as Db_session, async_sessionmaker
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+
+from app.config.card_config import CARD_FIELDS, DECK_PAGE_MAX_LIMIT, DECK_IMPORT_BATCH_SIZE
+from app.model.dto.answer_model_dto import DeckDTO, SmallDeckDTO, DeckImportResultDTO
+from app.services.deck_transfer_service import (
+    EXPORT_FORMATS, DeckImportError, stream_deck_export, iter_lines, iter_ndjson_records, iter_csv_records, card_values, insert_card_batch
+)
+from app.services.resolution_service import resolve_deck, select_deck_cards, resolve_session_decks, insert_deck, delete_deck, is_foreign_key_violation
+from app.services.resolution_cache_service import resolution_cache
+from app.services.review_buffer_service import review_buffer
+from app.services.vector_index_service import vector_index_service
 
-from sqlalchemy.orm import Session as Db_session
-from starlette.responses import JSONResponse
 
-from app.model.dao.deck_model_dao import Deck, Session, Card
-from app.model.dto.answer_model_dto import CardDTO, DeckDTO, SmallDeckDTO
+class DeckHandler:
 
+    async def get_deck_handler(self, db: Db_session, deck_name: str, session_uuid: str, after: Optional[int] = None, limit: Optional[int] = None, fields: Optional[str] = None, if_none_match: Optional[str] = None) -> Response:
 
-class DeckHandler:
+        card_fields = list(CARD_FIELDS)
+        if fields:
+            card_fields = [field.strip() for field in fields.split(",") if field.strip()]
+            if not card_fields or any(field not in CARD_FIELDS for field in card_fields):
+                return JSONResponse(content=f"Fields must be a comma separated subset of {', '.join(CARD_FIELDS)}", status_code=400)
+        if limit is not None:
+            limit = max(1, min(limit, DECK_PAGE_MAX_LIMIT))
 
-    async def get_deck_handler(self, db: Db_session, deck_name: str, session_uuid: str) -> JSONResponse:
+        # Buffered review results of the deck have to reach its cards (and its version) before the deck is read
+        await review_buffer.flush(session_uuid, deck_name)
 
-        existing_session = db.query(Session).filter_by(session_uuid=session_uuid).first()
-        if not existing_session:
+        resolution = await resolve_deck(db, session_uuid, deck_name)
+        if not resolution.session_found:
             return JSONResponse(content="Session not found", status_code=404)
-
-        deck = db.query(Deck).filter_by(deck_name=deck_name, session_uuid=session_uuid).first()
-        if not deck:
+        if not resolution.deck_id:
             return JSONResponse(content="Deck was not found", status_code=404)
 
-        cards = db.query(Card).filter(Card.deck_id == deck.id).all()
-        deck_dto = DeckDTO(
-            deck_name=deck.deck_name,
-            cards=[
-                CardDTO(
-                    card_front=card.card_front,
-                    card_back=card.card_back,
-                    card_uuid=card.card_uuid,
-                    last_learned=card.last_learned,
-                    next_learned=card.next_learned,
-                    stage=card.stage
-                ) for card in cards]
+        # The deck version changes with every card write, the page parameters pick the representation
+        page_key = hashlib.md5(f"{','.join(card_fields)}|{after}|{limit}".encode()).hexdigest()[:12]
+        etag = f'W/"{resolution.deck_id}-{resolution.version}-{page_key}"'
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        # One extra row tells whether there is a next page
+        rows = await select_deck_cards(db, resolution.deck_id, card_fields, after, limit + 1 if limit else None)
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1].id
+
+        # Rows go straight to orjson, building a CardDTO per card costs more than the query for large decks
+        return ORJSONResponse(
+            content={
+                "deck_name": deck_name,
+                "cards": [dict(zip(card_fields, row[1:])) for row in rows],
+                "next_cursor": next_cursor,
+            },
+            status_code=200,
+            headers={"ETag": etag},
         )
 
-        return JSONResponse(content=json.loads(deck_dto.model_dump_json()), status_code=200)
-
 
     async def get_decks_handler(self, db: Db_session, session_uuid: str) -> JSONResponse:
 
-        existing_session = db.query(Session).filter_by(session_uuid=session_uuid).first()
-        if not existing_session:
+        session_found, deck_names = await resolve_session_decks(db, session_uuid)
+        if not session_found:
             return JSONResponse(content="Session not found", status_code=404)
 
-        decks = db.query(Deck).filter(Deck.session_uuid == session_uuid).all()
-        if not decks:
+        if not deck_names:
             return JSONResponse(content="No decks found for the given session_id", status_code=404)
 
-        small_decks_dto = [SmallDeckDTO(deck_name=deck.deck_name) for deck in decks]
+        small_decks_dto = [SmallDeckDTO(deck_name=deck_name) for deck_name in deck_names]
 
         return JSONResponse(content=json.loads(json.dumps([deck.model_dump() for deck in small_decks_dto])), status_code=200)
 
 
     async def create_deck_handler(self, db: Db_session, deck_name: str, session_uuid: str) -> JSONResponse:
 
-        existing_session = db.query(Session).filter_by(session_uuid=session_uuid).first()
-        if not existing_session:
-            return JSONResponse(content="Session not found", status_code=404)
-
-        existing_deck = db.query(Deck).filter_by(deck_name=deck_name, session_uuid=session_uuid).first()
-        if existing_deck:
+        deck_id = await insert_deck(db, session_uuid, deck_name)
+        if not deck_id:
+            resolution = await resolve_deck(db, session_uuid, deck_name)
+            if not resolution.session_found:
+                return JSONResponse(content="Session not found", status_code=404)
             return JSONResponse(content="Deck already exists", status_code=400)
 
-        new_deck = Deck(deck_name=deck_name, session_uuid=session_uuid)
-        db.add(new_deck)
-        db.commit()
-        db.refresh(new_deck)
-        deck_dto = DeckDTO(deck_name=new_deck.deck_name, cards=[])
+        await db.commit()
+        resolution_cache.invalidate_deck(session_uuid, deck_name)
+        resolution_cache.put_deck_id(session_uuid, deck_name, deck_id)
+        deck_dto = DeckDTO(deck_name=deck_name, cards=[])
 
         return JSONResponse(content=json.loads(deck_dto.model_dump_json()), status_code=200)
 
 
     async def delete_deck_handler(self, db: Db_session, deck_name: str, session_uuid: str) -> JSONResponse:
 
-        existing_session = db.query(Session).filter_by(session_uuid=session_uuid).first()
-        if not existing_session:
+        if not await delete_deck(db, session_uuid, deck_name):
+            resolution = await resolve_deck(db, session_uuid, deck_name)
+            if not resolution.session_found:
+                return JSONResponse(content="Session not found", status_code=404)
+            return JSONResponse(content="Deck was not found", status_code=404)
+
+        await db.commit()
+        # Dropped only once the delete is visible, a lookup before the commit would cache the id again. Other workers
+        # keep their entry until it expires, writes through such a stale id re-resolve the deck
+        resolution_cache.invalidate_deck(session_uuid, deck_name)
+
+        # Chroma calls block, so the deck's vector indexes are dropped off the event loop
+        await asyncio.to_thread(vector_index_service.delete_deck_collections, session_uuid, deck_name)
+
+        return JSONResponse(content="Deck deleted successfully", status_code=200)
+
+
+    async def export_deck_handler(self, db: Db_session, deck_name: str, session_uuid: str, export_format: str, session_factory: async_sessionmaker) -> Response:
+
+        if export_format not in EXPORT_FORMATS:
+            return JSONResponse(content=f"Format must be one of {', '.join(EXPORT_FORMATS)}", status_code=400)
+
+        await review_buffer.flush(session_uuid, deck_name)
+
+        # A stale cached id would export an empty deck, one lookup is nothing next to streaming the cards
+        resolution = await resolve_deck(db, session_uuid, deck_name)
+        if not resolution.session_found:
             return JSONResponse(content="Session not found", status_code=404)
+        if not resolution.deck_id:
+            return JSONResponse(content="Deck was not found", status_code=404)
+
+        return StreamingResponse(
+            stream_deck_export(session_factory, resolution.deck_id, export_format),
+            media_type=EXPORT_FORMATS[export_format],
+            headers={"Content-Disposition": f'attachment; filename="deck.{export_format}"'},
+        )
+
 
-        deck = db.query(Deck).filter_by(deck_name=deck_name, session_uuid=session_uuid).first()
-        if not deck:
+    async def import_deck_handler(self, db: Db_session, deck_name: str, session_uuid: str, request: Request) -> JSONResponse:
+
+        content_type = request.headers.get("content-type", "").split(";")[0].strip()
+        if content_type not in EXPORT_FORMATS.values():
+            return JSONResponse(content=f"Content type must be one of {', '.join(EXPORT_FORMATS.values())}", status_code=400)
+
+        # The body cannot be read twice, so the import does not risk a stale cached id it would have to retry with
+        resolution = await resolve_deck(db, session_uuid, deck_name)
+        if not resolution.session_found:
+            return JSONResponse(content="Session not found", status_code=404)
+        if not resolution.deck_id:
             return JSONResponse(content="Deck was not found", status_code=404)
 
-        db.delete(deck)
-        db.commit()
+        iter_records = iter_csv_records if content_type == EXPORT_FORMATS["csv"] else iter_ndjson_records
+        imported_at = datetime.datetime.now(datetime.timezone.utc)
+        imported_count = 0
+        record_count = 0
+        batch = []
+
+        # The body is parsed while it arrives, only one batch of cards is held in memory
+        try:
+            async for record in iter_records(iter_lines(request.stream())):
+                record_count += 1
+                try:
+                    batch.append(card_values(record, resolution.deck_id, imported_at))
+                except (ValueError, TypeError) as e:
+                    raise DeckImportError(f"Card {record_count} has an invalid value: {e}")
+
+                if len(batch) >= DECK_IMPORT_BATCH_SIZE:
+                    imported_count += await insert_card_batch(db, batch)
+                    batch = []
+
+            if batch:
+                imported_count += await insert_card_batch(db, batch)
+
+        except DeckImportError as e:
+            await db.rollback()
+            logger.warning(f"Deck import rejected: {e}")
+            return JSONResponse(content=str(e), status_code=400)
+        except IntegrityError as e:
+            if not is_foreign_key_violation(e):
+                raise
+            # The deck was deleted while the cards were imported
+            await db.rollback()
+            resolution_cache.invalidate_deck(session_uuid, deck_name)
+            return JSONResponse(content="Deck was not found", status_code=404)
+
+        # The whole import is one transaction, a broken file leaves the deck untouched
+        await db.commit()
+
+        deck_import_result_dto = DeckImportResultDTO(imported_count=imported_count, skipped_count=record_count - imported_count)
 
-        return JSONResponse(content="Deck deleted successfully", status_code=200)
\ No newline at end of file
+        return JSONResponse(content=json.loads(deck_import_result_dto.model_dump_json()), status_code=200)
\ No newline at end of file
@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import json
+import os
+import uuid as uuid_module
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.config.document_config import UPLOAD_DIRECTORY, UPLOAD_MAX_BYTES
+from app.model.dto.request_model_dto import CustomFileModel
+from app.services.file_handler_service import SUPPORTED_FILE_TYPES
+from app.services.ingestion_job_service import ingestion_job_service
+
+
+class DocumentHandler:
+
+    async def upload_document_handler(self, file: CustomFileModel) -> JSONResponse:
+
+        if file.file_type not in SUPPORTED_FILE_TYPES:
+            return JSONResponse(content="File type is not supported", status_code=400)
+
+        job = ingestion_job_service.submit(file)
+
+        return JSONResponse(content=json.loads(job.model_dump_json()), status_code=202)
+
+
+    async def upload_document_stream_handler(self, request: Request) -> JSONResponse:
+
+        file_type = request.headers.get("content-type", "").split(";")[0].strip()
+        if file_type not in SUPPORTED_FILE_TYPES:
+            return JSONResponse(content="File type is not supported", status_code=400)
+
+        await asyncio.to_thread(os.makedirs, UPLOAD_DIRECTORY, exist_ok=True)
+        upload_path = os.path.join(UPLOAD_DIRECTORY, f"{uuid_module.uuid4()}.upload")
+        hash_object = hashlib.md5()
+        upload_size = 0
+
+        # The body is written to disk chunk by chunk and hashed on the way, it is never held in memory as a whole.
+        # File calls block, so they run off the event loop
+        upload_file = await asyncio.to_thread(open, upload_path, "wb")
+        try:
+            async for chunk in request.stream():
+                upload_size += len(chunk)
+                if upload_size > UPLOAD_MAX_BYTES:
+                    break
+                hash_object.update(chunk)
+                await asyncio.to_thread(upload_file.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(upload_file.close)
+            await asyncio.to_thread(os.remove, upload_path)
+            raise
+        await asyncio.to_thread(upload_file.close)
+
+        if upload_size > UPLOAD_MAX_BYTES:
+            await asyncio.to_thread(os.remove, upload_path)
+            return JSONResponse(content="File is too large", status_code=413)
+        if upload_size == 0:
+            await asyncio.to_thread(os.remove, upload_path)
+            return JSONResponse(content="File is empty", status_code=400)
+
+        job = ingestion_job_service.submit_upload(upload_path, file_type, hash_object.hexdigest())
+
+        return JSONResponse(content=json.loads(job.model_dump_json()), status_code=202)
+
+
+    async def get_document_job_handler(self, job_id: str) -> JSONResponse:
+
+        job = ingestion_job_service.get(job_id)
+        if not job:
+            return JSONResponse(content="Job not found", status_code=404)
+
+        return JSONResponse(content=json.loads(job.model_dump_json()), status_code=200)
\ No newline at end of file
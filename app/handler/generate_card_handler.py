@@ -1,60 +1,132 @@
+import asyncio
 import json
-from typing import Optional
+from typing import AsyncIterator, Optional
 
-import chromadb
+from langchain_chroma import Chroma
 from loguru import logger
-from sqlalchemy.orm import Session as Db_session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession as Db_session, async_sessionmaker
 from starlette.responses import JSONResponse
 
-from app.model.dao.deck_model_dao import Deck, Card
-from app.model.dto.request_model_dto import RequestModelDTO, CustomFileModel
-from app.services.chat_model_request_service import handle_chat_model_request
-from app.services.file_handler_service import FileHandlerService
-from app.utils.utils import generate_card_from_text
+from app.config.chat_model_config import batch_system_template, batch_part_template
+from app.config.generation_config import GENERATION_MAX_CARDS, GENERATION_CARDS_PER_REQUEST, GENERATION_STREAM_MAX_QUEUED_EVENTS
+from app.model.dto.answer_model_dto import CardDTO, GeneratedCardsDTO
+from app.model.dto.request_model_dto import RequestModelDTO
+from app.services.chat_model_request_service import handle_chat_model_request, stream_chat_model_request
+from app.services.file_handler_service import FileHandlerService, SUPPORTED_FILE_TYPES
+from app.services.file_store_service import file_store_service
+from app.services.chunk_store_service import chunk_store_service
+from app.services.vector_index_service import vector_index_service
+from app.services.response_cache_service import context_hash
+from app.services.resolution_service import resolve_deck_cached, refresh_deck, is_foreign_key_violation, insert_cards
+from app.services.generation_scheduler_service import run_blocking, generation_limiter, GenerationQueueTimeoutError
+from app.utils.utils import generate_card_from_text, generate_cards_from_text, format_sse_event
 
 fileHandlerService = FileHandlerService()
 
-file_store = {}
 
-def get_file(session_uuid: str, deck_name: str) -> Optional[CustomFileModel]:
-    unique_key = session_uuid + deck_name
-    if unique_key not in file_store:
-        file_store[unique_key] = None
-    return file_store[unique_key]
+class DocumentNotFoundError(Exception):
+    pass
 
 
-def generate_card_handler(request: RequestModelDTO, db: Db_session, prompt_template: str, ai_model: str) -> JSONResponse:
-    try:
+class StoredFileEvictedError(Exception):
+    pass
 
-        vectorstore = None
-        all_documents = []
 
-        if not get_file(request.session_uuid, request.deck.deck_name):
-            file_store[request.session_uuid + request.deck.deck_name] = request.file
+async def build_vectorstore(request: RequestModelDTO) -> tuple[Optional[Chroma], str]:
+    vectorstore = None
 
-        client = chromadb.Client()
-        collection = client.get_or_create_collection(name="collection")
+    if request.document_id:
+        # Ingested documents already have their chunks and lexical index, only the search is left
+        document_hash = request.document_id
+    else:
+        # The first supported file of a deck is remembered, later requests of the deck reuse it
+        unique_key = request.session_uuid + request.deck.deck_name
+        stored_file = file_store_service.get(unique_key)
+        if not stored_file and request.file and request.file.file_type in SUPPORTED_FILE_TYPES:
+            stored_file = await run_blocking(file_store_service.put, unique_key, request.file)
+        if not stored_file:
+            if file_store_service.was_evicted(unique_key):
+                raise StoredFileEvictedError(f"The stored file of deck {request.deck.deck_name} was evicted")
+            return vectorstore, ""
 
-        all_documents = fileHandlerService.csv_file_handler(
-            all_documents, get_file(request.session_uuid, request.deck.deck_name)
+        # Every blocking stage runs on the bounded generation executor, the event loop only awaits it
+        document_hash = await run_blocking(
+            fileHandlerService.document_file_handler,
+            file_store_service.body_path(stored_file), stored_file.file_type, stored_file.raw_hash
         )
+        if not document_hash:
+            # The body may have been evicted while it was read, get() notices that and drops the reference
+            if not file_store_service.get(unique_key):
+                raise StoredFileEvictedError(f"The stored file of deck {request.deck.deck_name} was evicted")
+            return vectorstore, ""
 
-        if all_documents:
-            # Split documents into manageable chunks for processing
-            chunked_documents = fileHandlerService.chunk_handler(all_documents)
+    chunk_store = await run_blocking(chunk_store_service.open, document_hash)
+    if chunk_store is None:
+        raise DocumentNotFoundError(f"Document {document_hash} was not ingested")
 
-            # **Call knn_search()**
-            query_indices = fileHandlerService.knn_search(chunked_documents, request.text)
+    # **Call knn_search()**
+    query_indices = await run_blocking(fileHandlerService.knn_search, document_hash, request.text)
+    if query_indices is None:
+        raise DocumentNotFoundError(f"The lexical index of document {document_hash} is missing")
 
-            # Use the indices to retrieve the relevant documents
-            relevant_documents = [chunked_documents[i] for i in query_indices]
+    # Use the indices to read only the relevant chunks from the chunk store
+    relevant_documents = chunk_store.read(query_indices)
 
-            # Encode the relevant document chunks and store them in the database
-            vectorstore = fileHandlerService.document_encoding_service(
-                collection, relevant_documents
-            )
+    collection = await run_blocking(
+        vector_index_service.get_collection, request.session_uuid, request.deck.deck_name, document_hash
+    )
+
+    # Encode the relevant document chunks and store them in the database
+    vectorstore = await run_blocking(
+        fileHandlerService.document_encoding_service, collection, relevant_documents
+    )
+
+    # The key covers only the retrieved chunks, so learners asking about the same part of a document share answers
+    # although every deck grows its own collection
+    relevant_chunk_ids = sorted({vector_index_service.chunk_id(chunk) for chunk in relevant_documents})
+    return vectorstore, context_hash(relevant_chunk_ids)
+
+
+async def save_cards(db: Db_session, request: RequestModelDTO, deck_id: int, card_dtos: list[CardDTO]) -> bool:
+    card_rows = [
+        {
+            "card_front": card_dto.card_front,
+            "card_back": card_dto.card_back,
+            "card_uuid": card_dto.card_uuid,
+            "last_learned": card_dto.last_learned,
+            "next_learned": card_dto.next_learned,
+        } for card_dto in card_dtos
+    ]
+
+    try:
+        await insert_cards(db, deck_id, card_rows)
+    except IntegrityError as e:
+        if not is_foreign_key_violation(e):
+            raise
+        # The deck id was stale or the deck was deleted during generation, the database decides which
+        await db.rollback()
+        deck_id = (await refresh_deck(db, request.session_uuid, request.deck.deck_name)).deck_id
+        if not deck_id:
+            return False
+        await insert_cards(db, deck_id, card_rows)
+
+    await db.commit()
+    return True
 
-        response = handle_chat_model_request(request, vectorstore, prompt_template, ai_model)
+
+async def generate_card_handler(request: RequestModelDTO, db: Db_session, prompt_template: str, ai_model: str) -> JSONResponse:
+    try:
+
+        # The deck is resolved before the LLM call, a card is never generated for a deck that does not exist
+        deck_id = (await resolve_deck_cached(db, request.session_uuid, request.deck.deck_name)).deck_id
+        if not deck_id:
+            return JSONResponse(content="Deck was not found", status_code=404)
+
+        async with generation_limiter.acquire(request.session_uuid):
+            vectorstore, context = await build_vectorstore(request)
+
+            response = await handle_chat_model_request(request, vectorstore, prompt_template, ai_model, context)
 
         try:
             card_dto = generate_card_from_text(response)
@@ -64,19 +136,187 @@ def generate_card_handler(request: RequestModelDTO, db: Db_session, prompt_templ
                 content={"answer": "An Internal Server Error occurred"}, status_code=500
             )
 
-        deck_id = db.query(Deck).filter_by(session_uuid=request.session_uuid, deck_name=request.deck.deck_name).first().id
-
-        card = Card(card_front=card_dto.card_front, card_back=card_dto.card_back, deck_id=deck_id, card_uuid=card_dto.card_uuid, last_learned=card_dto.last_learned, next_learned=card_dto.next_learned)
-        db.add(card)
-        db.commit()
-        db.refresh(card)
+        if not await save_cards(db, request, deck_id, [card_dto]):
+            return JSONResponse(content="Deck was not found", status_code=404)
 
         return JSONResponse(
             content=json.loads(card_dto.model_dump_json()), status_code=200
         )
 
+    except DocumentNotFoundError as e:
+        logger.warning(f"Card generation rejected: {e}")
+        return JSONResponse(content="Document not found, please upload it again", status_code=404)
+    except StoredFileEvictedError as e:
+        logger.warning(f"Card generation rejected: {e}")
+        return JSONResponse(content="The deck's file is no longer stored, please upload it again", status_code=410)
+    except GenerationQueueTimeoutError as e:
+        logger.warning(f"Card generation rejected: {e}")
+        return JSONResponse(
+            content={"answer": "Too many card generation requests, please try again later"}, status_code=503
+        )
+    except Exception as e:
+        logger.opt(exception=e).error(f"An error occurred while handling request")
+        return JSONResponse(
+            content={"answer": "An Internal Server Error occurred"}, status_code=500
+        )
+
+
+async def generate_card_batch(request: RequestModelDTO, vectorstore: Optional[Chroma], context: str, appending_prompt_template: str, ai_model: str, card_count: int, batch_number: int, batch_count: int) -> list[CardDTO]:
+    prompt_template = batch_system_template.format(card_count=card_count)
+    if batch_count > 1:
+        prompt_template += batch_part_template.format(batch_number=batch_number, batch_count=batch_count)
+    prompt_template += "\n" + appending_prompt_template
+
+    response = await handle_chat_model_request(request, vectorstore, prompt_template, ai_model, context)
+
+    card_dtos, rejected_lines = generate_cards_from_text(response)
+    if rejected_lines:
+        logger.warning(f"Skipped {len(rejected_lines)} lines of the model answer that were no valid flashcard")
+
+    return card_dtos[:card_count]
+
+
+async def generate_cards_handler(request: RequestModelDTO, db: Db_session, appending_prompt_template: str, ai_model: str, card_count: int) -> JSONResponse:
+    try:
+
+        card_count = max(1, min(card_count, GENERATION_MAX_CARDS))
+        batch_sizes = [
+            min(GENERATION_CARDS_PER_REQUEST, card_count - i)
+            for i in range(0, card_count, GENERATION_CARDS_PER_REQUEST)
+        ]
+
+        deck_id = (await resolve_deck_cached(db, request.session_uuid, request.deck.deck_name)).deck_id
+        if not deck_id:
+            return JSONResponse(content="Deck was not found", status_code=404)
+
+        # The whole batch takes one generation slot, its LLM round-trips run concurrently inside it
+        async with generation_limiter.acquire(request.session_uuid):
+            vectorstore, context = await build_vectorstore(request)
+
+            results = await asyncio.gather(
+                *[
+                    generate_card_batch(request, vectorstore, context, appending_prompt_template, ai_model, batch_size, batch_number, len(batch_sizes))
+                    for batch_number, batch_size in enumerate(batch_sizes, start=1)
+                ],
+                return_exceptions=True,
+            )
+
+        card_dtos = []
+        seen_fronts = set()
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.opt(exception=result).error(f"A batch of cards could not be generated")
+                continue
+
+            # Concurrent batches share the chat history only after they finished, so duplicates are dropped here
+            for card_dto in result:
+                if card_dto.card_front.lower() in seen_fronts:
+                    continue
+                seen_fronts.add(card_dto.card_front.lower())
+                card_dtos.append(card_dto)
+
+        if not card_dtos:
+            return JSONResponse(
+                content={"answer": "An Internal Server Error occurred"}, status_code=500
+            )
+
+        if not await save_cards(db, request, deck_id, card_dtos):
+            return JSONResponse(content="Deck was not found", status_code=404)
+
+        generated_cards_dto = GeneratedCardsDTO(
+            cards=card_dtos, requested_count=card_count, failed_count=card_count - len(card_dtos)
+        )
+
+        return JSONResponse(
+            content=json.loads(generated_cards_dto.model_dump_json()), status_code=200
+        )
+
+    except DocumentNotFoundError as e:
+        logger.warning(f"Card generation rejected: {e}")
+        return JSONResponse(content="Document not found, please upload it again", status_code=404)
+    except StoredFileEvictedError as e:
+        logger.warning(f"Card generation rejected: {e}")
+        return JSONResponse(content="The deck's file is no longer stored, please upload it again", status_code=410)
+    except GenerationQueueTimeoutError as e:
+        logger.warning(f"Card generation rejected: {e}")
+        return JSONResponse(
+            content={"answer": "Too many card generation requests, please try again later"}, status_code=503
+        )
     except Exception as e:
         logger.opt(exception=e).error(f"An error occurred while handling request")
         return JSONResponse(
             content={"answer": "An Internal Server Error occurred"}, status_code=500
         )
+
+
+def queue_event(events: asyncio.Queue, event: str) -> None:
+    # One place stays free for the end marker, so the generation never waits for the client
+    if events.qsize() < events.maxsize - 1:
+        events.put_nowait(event)
+
+
+async def generate_card_events(request: RequestModelDTO, prompt_template: str, ai_model: str, events: asyncio.Queue) -> str:
+    try:
+        async with generation_limiter.acquire(request.session_uuid):
+            queue_event(events, format_sse_event("stage", {"stage": "retrieving"}))
+            vectorstore, context = await build_vectorstore(request)
+
+            queue_event(events, format_sse_event("stage", {"stage": "generating"}))
+            response = ""
+            async for token in stream_chat_model_request(request, vectorstore, prompt_template, ai_model, context):
+                response += token
+                # Every partial event carries the whole text so far, skipping one while the queue is full loses nothing
+                card_front, _, card_back = response.partition(";")
+                queue_event(events, format_sse_event("partial", {"card_front": card_front.strip(), "card_back": card_back.strip()}))
+
+        return response
+    finally:
+        events.put_nowait(None)
+
+
+async def generate_card_stream_handler(request: RequestModelDTO, session_factory: async_sessionmaker, prompt_template: str, ai_model: str) -> AsyncIterator[str]:
+    try:
+
+        # The request scoped session is already closed while the response streams, so the stream opens its own ones
+        async with session_factory() as db:
+            deck_id = (await resolve_deck_cached(db, request.session_uuid, request.deck.deck_name)).deck_id
+        if not deck_id:
+            yield format_sse_event("error", {"answer": "Deck was not found"})
+            return
+
+        yield format_sse_event("stage", {"stage": "queued"})
+
+        # The generation runs as its own task and hands its slot on as soon as the model is done,
+        # a slow client only delays reading the queued events
+        events: asyncio.Queue = asyncio.Queue(maxsize=GENERATION_STREAM_MAX_QUEUED_EVENTS)
+        generation = asyncio.create_task(generate_card_events(request, prompt_template, ai_model, events))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            response = await generation
+        finally:
+            # A client that went away stops the generation as well
+            generation.cancel()
+
+        yield format_sse_event("stage", {"stage": "persisting"})
+        card_dto = generate_card_from_text(response)
+
+        async with session_factory() as db:
+            if not await save_cards(db, request, deck_id, [card_dto]):
+                yield format_sse_event("error", {"answer": "Deck was not found"})
+                return
+
+        yield format_sse_event("card", json.loads(card_dto.model_dump_json()))
+
+    except DocumentNotFoundError as e:
+        logger.warning(f"Card generation rejected: {e}")
+        yield format_sse_event("error", {"answer": "Document not found, please upload it again"})
+    except StoredFileEvictedError as e:
+        logger.warning(f"Card generation rejected: {e}")
+        yield format_sse_event("error", {"answer": "The deck's file is no longer stored, please upload it again"})
+    except GenerationQueueTimeoutError as e:
+        logger.warning(f"Card generation rejected: {e}")
+        yield format_sse_event("error", {"answer": "Too many card generation requests, please try again later"})
+    except Exception as e:
+        logger.opt(exception=e).error(f"An error occurred while handling request")
+        yield format_sse_event("error", {"answer": "An Internal Server Error occurred"})
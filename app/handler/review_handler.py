@@ -0,0 +1,78 @@
+import json
+from typing import Optional
+
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession as Db_session
+from starlette.responses import JSONResponse, Response
+
+from app.config.card_config import DUE_CARDS_MAX_LIMIT, REVIEW_DURABILITY
+from app.model.dto.answer_model_dto import ScheduledCardDTO
+from app.model.dto.request_model_dto import ReviewCardDTO, ReviewResultDTO
+from app.services.resolution_service import resolve_deck
+from app.services.review_buffer_service import review_buffer
+from app.services.review_service import select_due_cards, review_card, apply_review_results
+
+
+class ReviewHandler:
+
+    async def get_due_cards_handler(self, db: Db_session, session_uuid: str, deck_name: Optional[str], limit: int) -> Response:
+
+        limit = max(1, min(limit, DUE_CARDS_MAX_LIMIT))
+
+        # Buffered review results change what is due, so the ones of the session are written before the queue is read
+        await review_buffer.flush(session_uuid, deck_name)
+
+        due_cards = await select_due_cards(db, session_uuid, deck_name, limit)
+        if not due_cards:
+            # Nothing due is the common case, the 404s are only told apart then
+            resolution = await resolve_deck(db, session_uuid, deck_name or "")
+            if not resolution.session_found:
+                return JSONResponse(content="Session not found", status_code=404)
+            if deck_name is not None and not resolution.deck_id:
+                return JSONResponse(content="Deck was not found", status_code=404)
+
+        scheduled_card_dtos = [ScheduledCardDTO(**due_card._mapping) for due_card in due_cards]
+
+        return ORJSONResponse(content=[card.model_dump(mode="json") for card in scheduled_card_dtos], status_code=200)
+
+
+    async def review_card_handler(self, db: Db_session, session_uuid: str, deck_name: str, review_card_dto: ReviewCardDTO) -> JSONResponse:
+
+        await review_buffer.discard(session_uuid, deck_name, [review_card_dto.card_uuid])
+        card = await review_card(db, session_uuid, deck_name, review_card_dto.card_uuid, review_card_dto.correct)
+        if not card:
+            resolution = await resolve_deck(db, session_uuid, deck_name)
+            if not resolution.session_found:
+                return JSONResponse(content="Session not found", status_code=404)
+            if not resolution.deck_id:
+                return JSONResponse(content="Deck not found", status_code=404)
+            return JSONResponse(content="Card not found", status_code=404)
+
+        await db.commit()
+        scheduled_card_dto = ScheduledCardDTO(deck_name=deck_name, **card._mapping)
+
+        return JSONResponse(content=json.loads(scheduled_card_dto.model_dump_json()), status_code=200)
+
+
+    async def record_review_result_handler(self, db: Db_session, session_uuid: str, deck_name: str, review_result_dto: ReviewResultDTO) -> JSONResponse:
+
+        if REVIEW_DURABILITY == "write_behind" and review_buffer.add(session_uuid, deck_name, review_result_dto):
+            return JSONResponse(content="Review result accepted", status_code=202)
+
+        await review_buffer.discard(session_uuid, deck_name, [review_result_dto.card_uuid])
+        cards = await apply_review_results(db, [(
+            session_uuid, deck_name, review_result_dto.card_uuid,
+            review_result_dto.stage, review_result_dto.last_learned, review_result_dto.next_learned,
+        )])
+        if not cards:
+            resolution = await resolve_deck(db, session_uuid, deck_name)
+            if not resolution.session_found:
+                return JSONResponse(content="Session not found", status_code=404)
+            if not resolution.deck_id:
+                return JSONResponse(content="Deck not found", status_code=404)
+            return JSONResponse(content="Card not found", status_code=404)
+
+        await db.commit()
+        scheduled_card_dto = ScheduledCardDTO(deck_name=deck_name, **cards[0]._mapping)
+
+        return JSONResponse(content=json.loads(scheduled_card_dto.model_dump_json()), status_code=200)
\ No newline at end of file
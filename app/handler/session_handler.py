@@ -1,21 +1,30 @@
 import uuid as uuid_module
 
-from sqlalchemy.orm import Session as Db_session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession as Db_session
 from starlette.responses import JSONResponse
 
 from app.model.dao.deck_model_dao import Session
+from app.services.resolution_cache_service import resolution_cache
 
 class SessionHandler:
 
     async def get_or_create_session_handler(self, db: Db_session, session_uuid: str) -> JSONResponse:
 
-        session = db.query(Session).filter_by(session_uuid=session_uuid).first()
+        # Sessions are never deleted, so a cached one is answered without a DB round-trip
+        if resolution_cache.has_session(session_uuid):
+            return JSONResponse(content=session_uuid, status_code=200)
+
+        session = await db.scalar(select(Session).filter_by(session_uuid=session_uuid))
         if session:
+            resolution_cache.put_session(session_uuid)
             return JSONResponse(content=session_uuid, status_code=200)
 
         new_session = Session(session_uuid=str(uuid_module.uuid4()))
         db.add(new_session)
-        db.commit()
-        db.refresh(new_session)
+        await db.commit()
+        await db.refresh(new_session)
+        resolution_cache.invalidate_session(new_session.session_uuid)
+        resolution_cache.put_session(new_session.session_uuid)
 
         return JSONResponse(content=new_session.session_uuid, status_code=200)
\ No newline at end of file
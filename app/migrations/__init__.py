@@ -0,0 +1,9 @@
+from app.migrations import v0001_initial_schema, v0002_deck_version, v0003_card_schedule, v0004_card_defaults
+
+# Applied in this order, a version is never changed once it was released
+MIGRATIONS = [
+    v0001_initial_schema,
+    v0002_deck_version,
+    v0003_card_schedule,
+    v0004_card_defaults,
+]
\ No newline at end of file
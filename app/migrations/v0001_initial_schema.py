@@ -0,0 +1,35 @@
+VERSION = 1
+DESCRIPTION = "Initial schema with lookup indexes"
+
+# IF NOT EXISTS keeps databases that were created by the old create_all at startup
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id SERIAL PRIMARY KEY,
+        session_uuid VARCHAR UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS decks (
+        id SERIAL PRIMARY KEY,
+        deck_name VARCHAR NOT NULL,
+        session_uuid VARCHAR REFERENCES sessions (session_uuid)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cards (
+        id SERIAL PRIMARY KEY,
+        card_uuid VARCHAR NOT NULL,
+        card_front TEXT NOT NULL,
+        card_back TEXT NOT NULL,
+        deck_id INTEGER REFERENCES decks (id),
+        last_learned VARCHAR NOT NULL,
+        next_learned VARCHAR NOT NULL,
+        stage INTEGER NOT NULL
+    )
+    """,
+    # Decks are always looked up by session and name, the leading column also serves lookups by session
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_decks_session_uuid_deck_name ON decks (session_uuid, deck_name)",
+    # Cards are looked up by deck and uuid, the leading column also serves loading all cards of a deck
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_cards_deck_id_card_uuid ON cards (deck_id, card_uuid)",
+]
\ No newline at end of file
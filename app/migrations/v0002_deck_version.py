@@ -0,0 +1,35 @@
+VERSION = 2
+DESCRIPTION = "Deck version counter and keyset index on cards"
+
+STATEMENTS = [
+    "ALTER TABLE decks ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0",
+    # Pages of a deck are read in card id order after a cursor
+    "CREATE INDEX IF NOT EXISTS ix_cards_deck_id_id ON cards (deck_id, id)",
+    # Statement level, so a bulk write bumps every touched deck once instead of once per card
+    """
+    CREATE OR REPLACE FUNCTION bump_deck_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE decks SET version = version + 1 WHERE id IN (SELECT DISTINCT deck_id FROM changed_cards);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS cards_insert_bump_deck_version ON cards",
+    """
+    CREATE TRIGGER cards_insert_bump_deck_version AFTER INSERT ON cards
+    REFERENCING NEW TABLE AS changed_cards
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_deck_version()
+    """,
+    "DROP TRIGGER IF EXISTS cards_update_bump_deck_version ON cards",
+    """
+    CREATE TRIGGER cards_update_bump_deck_version AFTER UPDATE ON cards
+    REFERENCING NEW TABLE AS changed_cards
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_deck_version()
+    """,
+    "DROP TRIGGER IF EXISTS cards_delete_bump_deck_version ON cards",
+    """
+    CREATE TRIGGER cards_delete_bump_deck_version AFTER DELETE ON cards
+    REFERENCING OLD TABLE AS changed_cards
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_deck_version()
+    """,
+]
\ No newline at end of file
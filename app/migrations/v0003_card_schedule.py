@@ -0,0 +1,25 @@
+VERSION = 3
+DESCRIPTION = "Typed card scheduling columns and due index"
+
+STATEMENTS = [
+    # The legacy columns are free-form strings, anything that is no timestamp is treated as missing
+    """
+    CREATE OR REPLACE FUNCTION try_timestamptz(value TEXT) RETURNS TIMESTAMPTZ AS $$
+    BEGIN
+        RETURN value::timestamptz;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql STABLE
+    """,
+    "ALTER TABLE cards ADD COLUMN IF NOT EXISTS last_learned_at TIMESTAMPTZ",
+    "ALTER TABLE cards ADD COLUMN IF NOT EXISTS next_due TIMESTAMPTZ",
+    # Cards without a usable next date are due right away, like new cards
+    """
+    UPDATE cards
+    SET last_learned_at = try_timestamptz(last_learned),
+        next_due = COALESCE(try_timestamptz(next_learned), now())
+    """,
+    "ALTER TABLE cards ALTER COLUMN next_due SET DEFAULT now(), ALTER COLUMN next_due SET NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_cards_deck_id_next_due ON cards (deck_id, next_due)",
+]
\ No newline at end of file
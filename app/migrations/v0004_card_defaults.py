@@ -0,0 +1,12 @@
+VERSION = 4
+DESCRIPTION = "Server defaults for the legacy card learning columns"
+
+# The initial schema is released and never changes, so the defaults are added here for every database
+STATEMENTS = [
+    """
+    ALTER TABLE cards
+        ALTER COLUMN last_learned SET DEFAULT '',
+        ALTER COLUMN next_learned SET DEFAULT '',
+        ALTER COLUMN stage SET DEFAULT 0
+    """,
+]
\ No newline at end of file
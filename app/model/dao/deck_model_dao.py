@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, ForeignKey, DateTime, Index, func
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -15,9 +15,14 @@ class Session(Base):
 # Define the Deck model
 class Deck(Base):
     __tablename__ = "decks"
+    __table_args__ = (
+        Index("ix_decks_session_uuid_deck_name", "session_uuid", "deck_name", unique=True),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     deck_name = Column(String, nullable=False)
     session_uuid = Column(String, ForeignKey("sessions.session_uuid"), nullable=True)
+    # Bumped by a database trigger whenever cards of the deck change
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     # Relationship to cards
     cards = relationship("Card", back_populates="deck", cascade="all, delete-orphan")
@@ -27,6 +32,11 @@ class Deck(Base):
 # Define the Card model
 class Card(Base):
     __tablename__ = "cards"
+    __table_args__ = (
+        Index("ix_cards_deck_id_card_uuid", "deck_id", "card_uuid", unique=True),
+        Index("ix_cards_deck_id_id", "deck_id", "id"),
+        Index("ix_cards_deck_id_next_due", "deck_id", "next_due"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     card_uuid = Column(String, nullable=False)
     card_front = Column(Text, nullable=False)
@@ -35,6 +45,9 @@ class Card(Base):
     last_learned = Column(String, nullable=False, default="")
     next_learned = Column(String, nullable=False, default="")
     stage = Column(Integer, nullable=False, default=0)
+    # Typed schedule used by the due queue, new cards are due right away
+    last_learned_at = Column(DateTime(timezone=True), nullable=True)
+    next_due = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
 
     # Relationship back to the deck
     deck = relationship("Deck", back_populates="cards")
@@ -1,3 +1,4 @@
+import datetime
 from typing import Optional
 
 from pydantic import BaseModel
@@ -11,6 +12,11 @@ class CardDTO(BaseModel):
     next_learned: str = ""
     stage: int = 0
 
+class ScheduledCardDTO(CardDTO):
+    deck_name: str
+    last_learned_at: Optional[datetime.datetime] = None
+    next_due: datetime.datetime
+
 class DeckDTO(BaseModel):
     deck_name: str
     cards: Optional[list[CardDTO]] = None
@@ -19,3 +25,34 @@ class DeckDTO(BaseModel):
 class SmallDeckDTO(BaseModel):
     deck_name: str
 
+
+class GeneratedCardsDTO(BaseModel):
+    cards: list[CardDTO]
+    requested_count: int
+    failed_count: int = 0
+
+
+class IngestionJobDTO(BaseModel):
+    job_id: str
+    status: str = "queued"
+    stage: str = ""
+    progress: float = 0.0
+    document_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class CardResultDTO(BaseModel):
+    card_uuid: str
+    status_code: int
+    card: Optional[CardDTO] = None
+    error: Optional[str] = None
+
+
+class BulkCardResultDTO(BaseModel):
+    results: list[CardResultDTO]
+    succeeded_count: int
+    failed_count: int = 0
+
+class DeckImportResultDTO(BaseModel):
+    imported_count: int
+    skipped_count: int = 0
\ No newline at end of file
@@ -14,12 +14,22 @@ class RequestModelDTO(BaseModel):
     session_uuid: str
     deck: DeckDTO
     file: Optional[CustomFileModel] = None
+    document_id: Optional[str] = None
 
 class GenerateCardDTO(BaseModel):
     text: str = ""
     appending_prompt_template: str = ""
     ai_model: str = ""
     file: Optional[CustomFileModel] = None
+    document_id: str = ""
+
+class GenerateCardsDTO(BaseModel):
+    text: str = ""
+    appending_prompt_template: str = ""
+    ai_model: str = ""
+    card_count: int = 10
+    file: Optional[CustomFileModel] = None
+    document_id: str = ""
 
 class CreateCardDTO(BaseModel):
     card_front: str = ""
@@ -34,3 +44,14 @@ class UpdateCardDTO(BaseModel):
     last_learned: str = ""
     next_learned: str = ""
     stage: int = 0
+
+
+class ReviewCardDTO(BaseModel):
+    card_uuid: str = ""
+    correct: bool = False
+
+class ReviewResultDTO(BaseModel):
+    card_uuid: str = ""
+    stage: int = 0
+    last_learned: str = ""
+    next_learned: str = ""
\ No newline at end of file
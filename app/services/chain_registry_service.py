@@ -0,0 +1,160 @@
+import hashlib
+import threading
+from operator import itemgetter
+
+import httpx
+from cachetools import LRUCache
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain.chains.history_aware_retriever import create_history_aware_retriever
+from langchain.chains.retrieval import create_retrieval_chain
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnablePassthrough, RunnableWithMessageHistory
+from langchain_groq import ChatGroq
+
+from app.config.chat_model_config import (
+    CHAIN_REGISTRY_SIZE,
+    CHAT_MODEL_API_KEY,
+    CHAT_MODEL_MAX_CONNECTIONS,
+    CHAT_MODEL_MAX_KEEPALIVE_CONNECTIONS,
+    CHAT_MODEL_TEMPERATURE,
+    context_template,
+)
+from app.services.chat_history_store_service import chat_history_store, history_trimmer
+
+# Only the newest messages that fit the token window reach the prompt, the stored history stays untouched
+trim_chat_history = RunnablePassthrough.assign(chat_history=itemgetter("chat_history") | history_trimmer)
+
+
+def get_base_chat_history(unique_key: str) -> BaseChatMessageHistory:
+    return chat_history_store.get(unique_key)
+
+
+def retrieve_documents(query: str, config: RunnableConfig) -> list[Document]:
+    return config["configurable"]["vectorstore"].as_retriever().invoke(query, config)
+
+
+async def aretrieve_documents(query: str, config: RunnableConfig) -> list[Document]:
+    return await config["configurable"]["vectorstore"].as_retriever().ainvoke(query, config)
+
+
+# Prebuilt chains are shared by all requests, so the per-request vectorstore comes in through the config
+request_retriever = RunnableLambda(retrieve_documents, afunc=aretrieve_documents)
+
+
+class ChatModelPool:
+    def __init__(self, max_connections: int, max_keepalive_connections: int):
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+        # All model clients talk to the same API, so they share the keep-alive connections
+        self.http_client = httpx.Client(limits=limits)
+        self.http_async_client = httpx.AsyncClient(limits=limits)
+        self.chat_models: dict[str, ChatGroq] = {}
+        self.lock = threading.Lock()
+
+    def get(self, ai_model: str) -> ChatGroq:
+        if not CHAT_MODEL_API_KEY:
+            raise RuntimeError("GROQ_API_KEY is not set")
+
+        with self.lock:
+            if ai_model not in self.chat_models:
+                self.chat_models[ai_model] = ChatGroq(
+                    temperature=CHAT_MODEL_TEMPERATURE,
+                    model=ai_model,
+                    api_key=CHAT_MODEL_API_KEY,
+                    http_client=self.http_client,
+                    http_async_client=self.http_async_client,
+                )
+            return self.chat_models[ai_model]
+
+    async def aclose(self) -> None:
+        self.http_client.close()
+        await self.http_async_client.aclose()
+
+
+class ChainRegistry:
+    def __init__(self, chat_model_pool: ChatModelPool, size: int):
+        self.chat_model_pool = chat_model_pool
+        self.chains: LRUCache = LRUCache(maxsize=size)
+        self.lock = threading.Lock()
+
+    def _build(self, ai_model: str, prompt_template: str, rag: bool) -> RunnableWithMessageHistory:
+        chat_model = self.chat_model_pool.get(ai_model)
+
+        prompt_message = ChatPromptTemplate.from_messages(
+            [
+                (
+                    "system",
+                    prompt_template,
+                ),
+                MessagesPlaceholder("chat_history"),
+                (
+                    "human",
+                    "{input}",
+                ),
+            ]
+        )
+
+        if rag:  # RAG-Version
+            # The context instructions are appended to the caller's template so single and batch prompts both get them
+            system_prompt_with_context = prompt_template + context_template
+
+            prompt_message_with_context = ChatPromptTemplate.from_messages(
+                [
+                    (
+                        "system",
+                        system_prompt_with_context,
+                    ),
+                    MessagesPlaceholder("chat_history"),
+                    (
+                        "human",
+                        "{input}",
+                    ),
+                ]
+            )
+
+            question_answer_chain = create_stuff_documents_chain(
+                chat_model, prompt_message_with_context
+            )
+
+            history_aware_retriever = create_history_aware_retriever(
+                chat_model, request_retriever, prompt_message
+            )
+
+            chain = trim_chat_history | create_retrieval_chain(
+                history_aware_retriever, question_answer_chain
+            )
+
+            return RunnableWithMessageHistory(
+                chain,
+                get_base_chat_history,
+                input_messages_key="input",
+                history_messages_key="chat_history",
+                output_messages_key="answer",
+            )
+
+        else:  # Non-RAG-Version
+            chain = trim_chat_history | prompt_message | chat_model
+
+            return RunnableWithMessageHistory(
+                chain,
+                get_base_chat_history,
+                input_messages_key="input",
+                history_messages_key="chat_history",
+            )
+
+    def get(self, ai_model: str, prompt_template: str, rag: bool) -> RunnableWithMessageHistory:
+        key = (ai_model, hashlib.sha256(prompt_template.encode()).hexdigest(), rag)
+
+        with self.lock:
+            chain = self.chains.get(key)
+        if chain is None:
+            # Building twice under a race is harmless, both chains are equivalent
+            chain = self._build(ai_model, prompt_template, rag)
+            with self.lock:
+                self.chains[key] = chain
+        return chain
+
+
+chat_model_pool = ChatModelPool(CHAT_MODEL_MAX_CONNECTIONS, CHAT_MODEL_MAX_KEEPALIVE_CONNECTIONS)
+chain_registry = ChainRegistry(chat_model_pool, CHAIN_REGISTRY_SIZE)
\ No newline at end of file
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Sequence
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import BaseMessage, trim_messages
+from loguru import logger
+
+from app.config.chat_model_config import (
+    CHAT_HISTORY_MAX_BYTES,
+    CHAT_HISTORY_MAX_ENTRIES,
+    CHAT_HISTORY_MAX_MESSAGES,
+    CHAT_HISTORY_MAX_TOKENS,
+    CHAT_HISTORY_TTL,
+)
+
+
+def message_size(message: BaseMessage) -> int:
+    return len(str(message.content).encode("utf-8"))
+
+
+def estimate_tokens(messages: list[BaseMessage]) -> int:
+    # Roughly four characters per token plus the per-message overhead, close enough for a budget
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+class BoundedChatMessageHistory(InMemoryChatMessageHistory):
+    max_messages: int = CHAT_HISTORY_MAX_MESSAGES
+    size_bytes: int = 0
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.messages.extend(messages)
+        self.size_bytes += sum(message_size(message) for message in messages)
+
+        # Messages arrive as question/answer pairs, so an even limit never cuts a pair in half
+        overflow = len(self.messages) - self.max_messages
+        if overflow > 0:
+            self.size_bytes -= sum(message_size(message) for message in self.messages[:overflow])
+            del self.messages[:overflow]
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.add_messages(messages)
+
+    def clear(self) -> None:
+        super().clear()
+        self.size_bytes = 0
+
+
+class ChatHistoryStore:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Least recently used first, every value is (history, last access)
+        self.histories: OrderedDict[str, tuple[BoundedChatMessageHistory, float]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        while self.histories:
+            _, (_, last_access) = next(iter(self.histories.items()))
+            if now - last_access <= self.ttl and len(self.histories) <= self.max_entries:
+                break
+            self.histories.popitem(last=False)
+
+        total_bytes = sum(history.size_bytes for history, _ in self.histories.values())
+        while total_bytes > self.max_bytes and len(self.histories) > 1:
+            unique_key, (history, _) = self.histories.popitem(last=False)
+            total_bytes -= history.size_bytes
+            logger.debug(f"Evicted chat history {unique_key} to stay within the byte budget")
+
+    def get(self, unique_key: str) -> BoundedChatMessageHistory:
+        now = time.monotonic()
+        with self.lock:
+            if unique_key in self.histories:
+                history, _ = self.histories.pop(unique_key)
+            else:
+                history = BoundedChatMessageHistory()
+            self.histories[unique_key] = (history, now)
+
+            self._evict(now)
+            return history
+
+    def __len__(self) -> int:
+        return len(self.histories)
+
+
+chat_history_store = ChatHistoryStore(CHAT_HISTORY_MAX_ENTRIES, CHAT_HISTORY_MAX_BYTES, CHAT_HISTORY_TTL)
+
+history_trimmer = trim_messages(
+    max_tokens=CHAT_HISTORY_MAX_TOKENS,
+    token_counter=estimate_tokens,
+    strategy="last",
+    start_on="human",
+    allow_partial=False,
+)
\ No newline at end of file
@@ -1,136 +1,90 @@
-from typing import Optional
+from typing import AsyncIterator, Optional
 
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains.history_aware_retriever import create_history_aware_retriever
-from langchain.chains.retrieval import create_retrieval_chain
 from langchain_chroma import Chroma
-
-from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.runnables.utils import Output
 from loguru import logger
 
-from app.config.chat_model_config import chat_model
 from app.model.dto.request_model_dto import RequestModelDTO
-
-base_chat_store = {}
+from app.services.chain_registry_service import chain_registry, get_base_chat_history
+from app.services.generation_scheduler_service import run_blocking
+from app.services.response_cache_service import response_cache
 
 
-def get_base_chat_history(unique_key: str) -> BaseChatMessageHistory:
-    if unique_key not in base_chat_store:
-        base_chat_store[unique_key] = ChatMessageHistory()
-    return base_chat_store[unique_key]
+async def lookup_cached_response(
+        request: RequestModelDTO, unique_key: str, prompt_template: str, ai_model: str, context: str
+) -> Optional[str]:
+    cached_answer = await run_blocking(
+        response_cache.get, ai_model, prompt_template, context, request.text, unique_key
+    )
+    if cached_answer is not None:
+        # The deck's history still has to know the card, otherwise the model would suggest it again
+        get_base_chat_history(unique_key).add_messages([HumanMessage(request.text), AIMessage(cached_answer)])
+    return cached_answer
 
 
-def handle_chat_model_request(
-        request: RequestModelDTO, vectorstore: Optional[Chroma], prompt_template: str, ai_model: str
+async def handle_chat_model_request(
+        request: RequestModelDTO, vectorstore: Optional[Chroma], prompt_template: str, ai_model: str, context: str = ""
 ) -> Optional[str]:
     try:
-        chain_with_message_history: RunnableWithMessageHistory
-
-        chat_model.model_name = ai_model
         unique_key = request.session_uuid + request.deck.deck_name
 
-        prompt_message = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    prompt_template,
-                ),
-                MessagesPlaceholder("chat_history"),
-                (
-                    "human",
-                    "{input}",
-                ),
-            ]
+        cached_answer = await lookup_cached_response(request, unique_key, prompt_template, ai_model, context)
+        if cached_answer is not None:
+            return cached_answer
+
+        chain_with_message_history = chain_registry.get(ai_model, prompt_template, rag=vectorstore is not None)
+
+        model_answer: Output = await chain_with_message_history.ainvoke(
+            {
+                "input": request.text,
+                "chat_history": get_base_chat_history(unique_key),
+            },
+            config={"configurable": {"session_id": unique_key, "vectorstore": vectorstore}},
         )
 
-        if vectorstore:  # RAG-Version
-            retriever = vectorstore.as_retriever()
-
-            system_prompt_with_context = (
-                "You are an expert tutor. "
-                "Create exactly one flashcards based on the given topic. "
-                "The flashcard must strictly follow the format 'Question ; Answer'. "
-                "The output should only contain the flashcard in this format, without any additional text, explanations, or introductions. "
-                "Respond with only the flashcard, nothing else. "
-                "All content should be in English."
-                "Use the following pieces of retrieved context to form a response."
-                "Always prioritize the context you have."
-                "If you don't know the answer then you will use your knowledge."
-                "Keep the answer concise."
-                "\n\n"
-                "{context}"
-            )
-
-            prompt_message_with_context = ChatPromptTemplate.from_messages(
-                [
-                    (
-                        "system",
-                        system_prompt_with_context,
-                    ),
-                    MessagesPlaceholder("chat_history"),
-                    (
-                        "human",
-                        "{input}",
-                    ),
-                ]
-            )
-
-            question_answer_chain = create_stuff_documents_chain(
-                chat_model, prompt_message_with_context
-            )
-
-            history_aware_retriever = create_history_aware_retriever(
-                chat_model, retriever, prompt_message
-            )
-
-            chain = create_retrieval_chain(
-                history_aware_retriever, question_answer_chain
-            )
-
-            chain_with_message_history = RunnableWithMessageHistory(
-                chain,
-                get_base_chat_history,
-                input_messages_key="input",
-                history_messages_key="chat_history",
-                output_messages_key="answer",
-            )
-
-            model_answer: Output = chain_with_message_history.invoke(
-                {
-                    "input": request.text,
-                    "chat_history": get_base_chat_history(unique_key),
-                },
-                config={"configurable": {"session_id": unique_key}},
-            )
-
-            return model_answer["answer"]
-
-        else:  # Non-RAG-Version
-            chain = prompt_message | chat_model
-
-            chain_with_message_history = RunnableWithMessageHistory(
-                chain,
-                get_base_chat_history,
-                input_messages_key="input",
-                history_messages_key="chat_history",
-            )
-
-            model_answer = chain_with_message_history.invoke(
-                {
-                    "input": request.text,
-                    "chat_history": get_base_chat_history(unique_key),
-                },
-                config={"configurable": {"session_id": unique_key}},
-            )
-
-            return model_answer.content
+        answer = model_answer["answer"] if vectorstore else model_answer.content
+        await run_blocking(response_cache.put, ai_model, prompt_template, context, request.text, unique_key, answer)
+        return answer
 
     except Exception as e:
         logger.opt(exception=e).error(
             f"An error occurred while trying to do a reqeust to the chat model"
         )
         raise e
+
+
+async def stream_chat_model_request(
+        request: RequestModelDTO, vectorstore: Optional[Chroma], prompt_template: str, ai_model: str, context: str = ""
+) -> AsyncIterator[str]:
+    try:
+        unique_key = request.session_uuid + request.deck.deck_name
+
+        cached_answer = await lookup_cached_response(request, unique_key, prompt_template, ai_model, context)
+        if cached_answer is not None:
+            yield cached_answer
+            return
+
+        answer = ""
+        chain_with_message_history = chain_registry.get(ai_model, prompt_template, rag=vectorstore is not None)
+
+        async for chunk in chain_with_message_history.astream(
+            {
+                "input": request.text,
+                "chat_history": get_base_chat_history(unique_key),
+            },
+            config={"configurable": {"session_id": unique_key, "vectorstore": vectorstore}},
+        ):
+            # The retrieval chain streams dict updates (input, context, answer), the plain chain message chunks
+            token = chunk.get("answer") if vectorstore else chunk.content
+            if token:
+                answer += token
+                yield token
+
+        await run_blocking(response_cache.put, ai_model, prompt_template, context, request.text, unique_key, answer)
+
+    except Exception as e:
+        logger.opt(exception=e).error(
+            f"An error occurred while trying to stream a reqeust to the chat model"
+        )
+        raise e
\ No newline at end of file
@@ -0,0 +1,112 @@
+import os
+import re
+import shutil
+import threading
+from typing import Optional
+
+import numpy as np
+from cachetools import LRUCache
+from loguru import logger
+
+from app.config.document_config import DOCUMENT_DIRECTORY, DOCUMENT_STORE_MAX_BYTES, CHUNK_STORE_CACHE_SIZE
+
+
+class ChunkStore:
+    def __init__(self, directory: str):
+        # Both files are memory-mapped, reading a chunk only touches the pages it lives in
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        blob_path = os.path.join(directory, "chunks.bin")
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else np.empty(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return max(len(self.offsets) - 1, 0)
+
+    def read(self, indices: list[int]) -> list[str]:
+        return [
+            self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+            for i in indices
+        ]
+
+    def read_all(self) -> list[str]:
+        return self.read(list(range(len(self))))
+
+
+class ChunkStoreService:
+    def __init__(self, directory: str, max_bytes: int, cache_size: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stores: LRUCache = LRUCache(maxsize=cache_size)
+        self.lock = threading.Lock()
+
+    def _document_directory(self, document_hash: str) -> str:
+        return os.path.join(self.directory, document_hash)
+
+    def exists(self, document_hash: str) -> bool:
+        return os.path.exists(os.path.join(self._document_directory(document_hash), "offsets.npy"))
+
+    def write(self, document_hash: str, chunks: list[str]) -> None:
+        document_directory = self._document_directory(document_hash)
+        os.makedirs(document_directory, exist_ok=True)
+
+        encoded_chunks = [chunk.encode("utf-8") for chunk in chunks]
+        offsets = np.zeros(len(encoded_chunks) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(chunk) for chunk in encoded_chunks])
+
+        # The offsets are written last, their presence marks the store as complete
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(os.path.join(document_directory, "chunks.bin" + suffix), "wb") as blob_file:
+            for chunk in encoded_chunks:
+                blob_file.write(chunk)
+        os.replace(os.path.join(document_directory, "chunks.bin" + suffix), os.path.join(document_directory, "chunks.bin"))
+
+        with open(os.path.join(document_directory, "offsets.npy" + suffix), "wb") as offsets_file:
+            np.save(offsets_file, offsets)
+        os.replace(os.path.join(document_directory, "offsets.npy" + suffix), os.path.join(document_directory, "offsets.npy"))
+
+    def open(self, document_hash: str) -> Optional[ChunkStore]:
+        # Document ids come from clients and end up in a path, so only md5 hex digests are accepted
+        if not re.fullmatch(r"[0-9a-f]{32}", document_hash) or not self.exists(document_hash):
+            return None
+
+        # The directory's mtime is the recency used by the eviction
+        os.utime(self._document_directory(document_hash))
+
+        with self.lock:
+            store = self.stores.get(document_hash)
+            if store is None:
+                store = ChunkStore(self._document_directory(document_hash))
+                self.stores[document_hash] = store
+            return store
+
+    def enforce_budget(self, keep: Optional[str] = None) -> list[str]:
+        if not os.path.exists(self.directory):
+            return []
+
+        documents = []
+        total_size = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            documents.append((entry.stat().st_mtime, entry.name, size))
+            total_size += size
+
+        evicted = []
+        for _, document_hash, size in sorted(documents):
+            if total_size <= self.max_bytes:
+                break
+            if document_hash == keep:
+                continue
+
+            with self.lock:
+                self.stores.pop(document_hash, None)
+            shutil.rmtree(self._document_directory(document_hash), ignore_errors=True)
+            total_size -= size
+            evicted.append(document_hash)
+
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} documents to stay within the document store budget")
+        return evicted
+
+
+chunk_store_service = ChunkStoreService(DOCUMENT_DIRECTORY, DOCUMENT_STORE_MAX_BYTES, CHUNK_STORE_CACHE_SIZE)
\ No newline at end of file
@@ -0,0 +1,103 @@
+import threading
+import time
+from typing import AsyncGenerator
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession as Async_db_session
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+from app.config.database_connection_config import (
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_PRE_PING,
+    DATABASE_POOL_RECYCLE,
+    DATABASE_POOL_SIZE,
+    DATABASE_POOL_TIMEOUT,
+    DATABASE_STATEMENT_TIMEOUT,
+    DATABASE_URL,
+)
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, wait_seconds: float, timed_out: bool) -> None:
+        with self.lock:
+            # A timed out wait always lasts the pool timeout, it is only counted, the wait statistics cover checkouts
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self) -> ConnectionPoolEntry:
+        # Covers waiting for a free connection as well as opening a new one
+        started = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record(time.monotonic() - started, timed_out=True)
+            raise
+        pool_metrics.record(time.monotonic() - started, timed_out=False)
+        return connection
+
+
+pool_options = {
+    "pool_size": DATABASE_POOL_SIZE,
+    "max_overflow": DATABASE_MAX_OVERFLOW,
+    "pool_timeout": DATABASE_POOL_TIMEOUT,
+    "pool_recycle": DATABASE_POOL_RECYCLE,
+    "pool_pre_ping": DATABASE_POOL_PRE_PING,
+}
+
+# The sync engine is only used at startup, a single connection is enough for it
+engine = create_engine(
+    make_url(DATABASE_URL).set(drivername="postgresql"),
+    pool_size=1,
+    max_overflow=0,
+    pool_pre_ping=DATABASE_POOL_PRE_PING,
+    connect_args={"options": f"-c statement_timeout={DATABASE_STATEMENT_TIMEOUT}"},
+)
+SessionLocal = sessionmaker(bind=engine)
+
+# Every endpoint goes through the async engine so DB round-trips don't block the event loop
+async_engine = create_async_engine(
+    make_url(DATABASE_URL).set(drivername="postgresql+asyncpg"),
+    poolclass=InstrumentedAsyncQueuePool,
+    connect_args={"server_settings": {"statement_timeout": str(DATABASE_STATEMENT_TIMEOUT)}},
+    **pool_options,
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+
+async def get_async_db() -> AsyncGenerator[Async_db_session, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def pool_stats() -> dict:
+    pool = async_engine.pool
+    with pool_metrics.lock:
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "checkouts": pool_metrics.checkouts,
+            "timeouts": pool_metrics.timeouts,
+            "wait_seconds_avg": pool_metrics.wait_seconds_total / pool_metrics.checkouts if pool_metrics.checkouts else 0.0,
+            "wait_seconds_max": pool_metrics.wait_seconds_max,
+        }
\ No newline at end of file
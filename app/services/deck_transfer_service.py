@@ -0,0 +1,166 @@
+import csv
+import datetime
+import io
+import uuid as uuid_module
+from typing import AsyncIterator, Iterator, Optional
+
+import orjson
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as upsert
+from sqlalchemy.ext.asyncio import AsyncSession as Db_session, async_sessionmaker
+
+from app.config.card_config import CARD_FIELDS, DECK_EXPORT_BATCH_SIZE, DECK_IMPORT_MAX_LINE_BYTES
+from app.model.dao.deck_model_dao import Card
+
+EXPORT_FIELDS = (*CARD_FIELDS, "last_learned_at", "next_due")
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+class DeckImportError(Exception):
+    pass
+
+
+def card_record(row) -> dict:
+    record = dict(zip(EXPORT_FIELDS, row))
+    for field in ("last_learned_at", "next_due"):
+        if record[field] is not None:
+            record[field] = record[field].isoformat()
+    return record
+
+
+async def stream_deck_export(session_factory: async_sessionmaker, deck_id: int, export_format: str) -> AsyncIterator[bytes]:
+    # The request scoped session is closed once the response starts streaming, the export gets its own one
+    async with session_factory() as db:
+        # A server-side cursor, only one batch of rows is held in memory at a time
+        result = await db.stream(
+            select(*[getattr(Card, field) for field in EXPORT_FIELDS])
+            .where(Card.deck_id == deck_id)
+            .order_by(Card.id)
+            .execution_options(yield_per=DECK_EXPORT_BATCH_SIZE)
+        )
+
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+            async for rows in result.partitions():
+                writer.writerows(card_record(row).values() for row in rows)
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.getvalue():
+                yield buffer.getvalue().encode("utf-8")
+        else:
+            async for rows in result.partitions():
+                yield b"".join(orjson.dumps(card_record(row)) + b"\n" for row in rows)
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    timestamp = datetime.datetime.fromisoformat(value)
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=datetime.timezone.utc)
+
+
+def card_values(record: dict, deck_id: int, imported_at: datetime.datetime) -> dict:
+    card_uuid = record.get("card_uuid")
+    if card_uuid is not None and not isinstance(card_uuid, str):
+        raise TypeError(f"card_uuid must be a string, not {type(card_uuid).__name__}")
+
+    last_learned = str(record.get("last_learned") or "")
+    next_learned = str(record.get("next_learned") or "")
+
+    return {
+        "deck_id": deck_id,
+        "card_uuid": card_uuid or str(uuid_module.uuid4()),
+        "card_front": str(record.get("card_front") or ""),
+        "card_back": str(record.get("card_back") or ""),
+        "last_learned": last_learned,
+        "next_learned": next_learned,
+        "stage": int(record.get("stage") or 0),
+        # Files without the typed schedule fall back to the string columns, the database parses them like on updates
+        "last_learned_at": parse_timestamp(record.get("last_learned_at")) or (
+            func.try_timestamptz(last_learned) if last_learned else None
+        ),
+        # Cards without any schedule are due right away, like newly created ones
+        "next_due": parse_timestamp(record.get("next_due")) or (
+            func.coalesce(func.try_timestamptz(next_learned), imported_at) if next_learned else imported_at
+        ),
+    }
+
+
+def decode_line(line: bytes) -> str:
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise DeckImportError(f"The file is no valid UTF-8: {e.reason} at byte {e.start} of a line")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # Lines are split before decoding, a newline byte never occurs inside a multi-byte UTF-8 character
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if len(line) > DECK_IMPORT_MAX_LINE_BYTES:
+                raise DeckImportError(f"A line is longer than {DECK_IMPORT_MAX_LINE_BYTES} bytes")
+            yield decode_line(line + b"\n")
+        if len(pending) > DECK_IMPORT_MAX_LINE_BYTES:
+            raise DeckImportError(f"A line is longer than {DECK_IMPORT_MAX_LINE_BYTES} bytes")
+    if pending:
+        yield decode_line(pending)
+
+
+async def iter_ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[dict]:
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            raise DeckImportError(f"Line {line_number} is no valid JSON")
+        if not isinstance(record, dict):
+            raise DeckImportError(f"Line {line_number} is no JSON object")
+        yield record
+
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[dict]:
+    header = None
+    record_lines = ""
+    record_size = 0
+    async for line in lines:
+        # Quoted fields may contain newlines, a record is complete once its quotes are balanced
+        record_lines += line
+        if record_lines.count('"') % 2:
+            record_size += len(line.encode("utf-8"))
+            if record_size > DECK_IMPORT_MAX_LINE_BYTES:
+                raise DeckImportError(f"A record is longer than {DECK_IMPORT_MAX_LINE_BYTES} bytes")
+            continue
+
+        values: Iterator[list[str]] = csv.reader(io.StringIO(record_lines))
+        record_lines = ""
+        record_size = 0
+        row = next(values, None)
+        if not row:
+            continue
+        if header is None:
+            header = row
+            continue
+        yield dict(zip(header, row))
+
+    if record_lines.strip():
+        raise DeckImportError("The last CSV record has an unterminated quote")
+
+
+async def insert_card_batch(db: Db_session, cards: list[dict]) -> int:
+    # One multi-row INSERT per batch, cards that already exist in the deck are skipped
+    inserted = await db.scalars(
+        upsert(Card)
+        .values(cards)
+        .on_conflict_do_nothing(index_elements=[Card.deck_id, Card.card_uuid])
+        .returning(Card.id)
+    )
+    return len(inserted.all())
\ No newline at end of file
@@ -0,0 +1,142 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import numpy as np
+from loguru import logger
+
+from app.config.embedding_config import EMBEDDING_CACHE_DIRECTORY, EMBEDDING_CACHE_MAX_BYTES, TRANSFORMER_DIMENSIONS
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str, dimensions: int, max_bytes: int):
+        self.dimensions = dimensions
+        self.capacity = max(1, max_bytes // (dimensions * np.dtype(np.float32).itemsize))
+        self.vectors_path = os.path.join(directory, f"vectors_{dimensions}.f32")
+        self.index_path = os.path.join(directory, f"index_{dimensions}.json")
+
+        self.directory = directory
+
+        self.lock_path = os.path.join(directory, f"cache_{dimensions}.lock")
+
+        # The thread lock guards the in-memory index, the file lock other workers sharing the directory
+        self.lock = threading.Lock()
+
+        # Maps the content key to its row in the memory-mapped array, ordered from least to most recently used
+        self.index: OrderedDict[str, int] = OrderedDict()
+        self.index_mtime = 0
+        self.next_slot = 0
+        self.vectors: Optional[np.memmap] = None
+
+    @contextmanager
+    def file_lock(self, shared: bool) -> Iterator[None]:
+        # Lookups share the lock and only writes take it exclusively, each acquisition opens its own descriptor
+        # since flock locks are held per open file
+        lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(lock_fd)
+
+    def _open(self) -> None:
+        # The files are only created on first use, importing the module never touches the disk
+        if self.vectors is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self.file_lock(shared=False):
+            self._open_vectors()
+
+    @staticmethod
+    def key(model_name: str, truncate_dim: int, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{truncate_dim}\0{text}".encode()).hexdigest()
+
+    def _open_vectors(self) -> None:
+        expected_size = self.capacity * self.dimensions * np.dtype(np.float32).itemsize
+
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) == expected_size:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dimensions))
+            self._load_index()
+        else:
+            # A changed size budget invalidates all slots, so the cache starts over
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="w+", shape=(self.capacity, self.dimensions))
+            self.index = OrderedDict()
+            self.next_slot = 0
+            self._write_index()
+
+    def _load_index(self) -> None:
+        try:
+            with open(self.index_path) as index_file:
+                entries = json.load(index_file)
+            self.index = OrderedDict((key, slot) for key, slot in entries if slot < self.capacity)
+            self.index_mtime = os.stat(self.index_path).st_mtime_ns
+        except (OSError, ValueError) as e:
+            logger.opt(exception=e).warning(f"The embedding cache index could not be read, starting with an empty cache")
+            self.index = OrderedDict()
+
+        # Slots are handed out in order and evictions reuse the evicted slot, so everything past the highest one is free
+        self.next_slot = max(self.index.values(), default=-1) + 1
+
+    def _reload_if_changed(self) -> None:
+        if os.path.exists(self.index_path) and os.stat(self.index_path).st_mtime_ns != self.index_mtime:
+            self._load_index()
+
+    def _write_index(self) -> None:
+        temporary_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as index_file:
+            json.dump(list(self.index.items()), index_file)
+        os.replace(temporary_path, self.index_path)
+        self.index_mtime = os.stat(self.index_path).st_mtime_ns
+
+    def get_many(self, keys: list[str]) -> list[Optional[np.ndarray]]:
+        with self.lock:
+            self._open()
+        with self.lock, self.file_lock(shared=True):
+            self._reload_if_changed()
+
+            embeddings = []
+            for key in keys:
+                slot = self.index.get(key)
+                if slot is None:
+                    embeddings.append(None)
+                    continue
+                # Recency of hits is only kept in memory and persisted with the next write
+                self.index.move_to_end(key)
+                embeddings.append(np.array(self.vectors[slot]))
+
+            return embeddings
+
+    def put_many(self, keys: list[str], embeddings: list[list[float]]) -> None:
+        with self.lock:
+            self._open()
+        with self.lock, self.file_lock(shared=False):
+            self._reload_if_changed()
+
+            for key, embedding in zip(keys, embeddings):
+                if key in self.index:
+                    slot = self.index[key]
+                    self.index.move_to_end(key)
+                elif self.next_slot < self.capacity:
+                    slot = self.next_slot
+                    self.next_slot += 1
+                    self.index[key] = slot
+                else:
+                    _, slot = self.index.popitem(last=False)
+                    self.index[key] = slot
+
+                self.vectors[slot] = np.asarray(embedding, dtype=np.float32)
+
+            # Vectors go to disk before the index references them
+            self.vectors.flush()
+            self._write_index()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIRECTORY, TRANSFORMER_DIMENSIONS, EMBEDDING_CACHE_MAX_BYTES)
\ No newline at end of file
@@ -0,0 +1,76 @@
+import concurrent.futures
+import threading
+
+from cachetools import LRUCache
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+
+from app.config.embedding_config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_QUERY_CACHE_SIZE,
+    EMBEDDING_QUERY_PROMPT,
+    TRANSFORMER_DIMENSIONS,
+)
+from app.services.embedding_cache_service import EmbeddingCache, embedding_cache
+
+BATCH_SIZE = 10
+
+
+class EmbeddingService(Embeddings):
+    def __init__(self, model_name: str, dimensions: int, query_cache_size: int):
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.model_transformer = SentenceTransformer(
+            model_name,
+            truncate_dim=dimensions,
+            device="cpu",
+        )
+        self.query_cache: LRUCache = LRUCache(maxsize=query_cache_size)
+        self.query_cache_lock = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        # Only chunks that are not in the embedding cache go through the transformer
+        cache_keys = [EmbeddingCache.key(self.model_name, self.dimensions, text) for text in texts]
+        document_embeddings = embedding_cache.get_many(cache_keys)
+        missing_indices = [i for i, embedding in enumerate(document_embeddings) if embedding is None]
+
+        if missing_indices:
+            missing_documents = [texts[i] for i in missing_indices]
+
+            # Split chunked_documents into batches
+            def encode_documents_batch(documents_batch):
+                return self.model_transformer.encode(documents_batch).tolist()
+
+            document_batches = [
+                missing_documents[i : i + BATCH_SIZE]
+                for i in range(0, len(missing_documents), BATCH_SIZE)
+            ]
+
+            # Use ThreadPoolExecutor to encode document batches concurrently, map keeps the batch order
+            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+                missing_embeddings = [
+                    embedding
+                    for batch_embeddings in executor.map(encode_documents_batch, document_batches)
+                    for embedding in batch_embeddings
+                ]
+
+            embedding_cache.put_many([cache_keys[i] for i in missing_indices], missing_embeddings)
+            for i, embedding in zip(missing_indices, missing_embeddings):
+                document_embeddings[i] = embedding
+
+        return [list(map(float, embedding)) for embedding in document_embeddings]
+
+    def embed_query(self, text: str) -> list[float]:
+        with self.query_cache_lock:
+            embedding = self.query_cache.get(text)
+        if embedding is not None:
+            return list(embedding)
+
+        embedding = self.model_transformer.encode(text, prompt=EMBEDDING_QUERY_PROMPT).tolist()
+
+        with self.query_cache_lock:
+            self.query_cache[text] = tuple(embedding)
+        return embedding
+
+
+embedding_service = EmbeddingService(EMBEDDING_MODEL_NAME, TRANSFORMER_DIMENSIONS, EMBEDDING_QUERY_CACHE_SIZE)
\ No newline at end of file
@@ -1,94 +1,131 @@
 import base64
-import io
+import multiprocessing
 import os
-import uuid
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional, Union
 
 from chromadb.api.models.Collection import Collection
 from langchain_chroma.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-import pandas as pd
-from PyPDF2 import PdfReader
 from loguru import logger
-from sentence_transformers import SentenceTransformer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.neighbors import NearestNeighbors
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-import concurrent.futures
 
+from app.config.document_config import RAW_DOCUMENT_DIRECTORY, PDF_EXTRACTION_WORKERS, PDF_PARALLEL_MIN_PAGES
 from app.model.dto.request_model_dto import CustomFileModel
-from app.utils.utils import generate_csv_filename_from_name, clean_text
+from app.services.chunk_store_service import chunk_store_service
+from app.services.embedding_service import embedding_service
+from app.services.lexical_index_service import lexical_index_service
+from app.services.vector_index_service import vector_index_service
+from app.utils.pdf_utils import open_pdf, extract_pdf_pages
+from app.utils.utils import generate_document_hash, clean_text
 
 DOCUMENTS_LIMIT = 45
 QUERY_RESULTS_LIMIT = 10
 CHUNK_SIZE = 600
 CHUNK_OVERLAP = 50
-BATCH_SIZE = 10
-TRANSFORMER_DIMENSIONS = 768
 MAX_URL_DEPTH = 5
+SUPPORTED_FILE_TYPES = ("text/plain", "application/pdf")
+
+# Spawned workers only import the small pdf utils module instead of forking the loaded models
+pdf_executor = ProcessPoolExecutor(
+    max_workers=PDF_EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn")
+)
 
 class FileHandlerService:
-    def __init__(self):
-        self.model_transformer = SentenceTransformer(
-            "mixedbread-ai/mxbai-embed-large-v1",
-            truncate_dim=TRANSFORMER_DIMENSIONS,
-            device="cpu",
-        )
-        self.vectorizer = TfidfVectorizer()
-
-    def csv_file_handler(
-            self, all_documents: list, file: Optional[CustomFileModel]
-    ) -> list[str]:
+    def lookup_document_hash(self, raw_hash: str) -> Optional[str]:
+        raw_document_file = os.path.join(RAW_DOCUMENT_DIRECTORY, raw_hash)
+        if not os.path.exists(raw_document_file):
+            return None
+        with open(raw_document_file) as f:
+            return f.read().strip() or None
+
+    def store_document_hash(self, raw_hash: str, document_hash: str) -> None:
+        os.makedirs(RAW_DOCUMENT_DIRECTORY, exist_ok=True)
+        temporary_path = os.path.join(RAW_DOCUMENT_DIRECTORY, f"{raw_hash}.{os.getpid()}.tmp")
+        with open(temporary_path, "w") as f:
+            f.write(document_hash)
+        os.replace(temporary_path, os.path.join(RAW_DOCUMENT_DIRECTORY, raw_hash))
+
+    def extract_pdf_text(self, raw_content: Union[bytes, str]) -> str:
+        page_count = len(open_pdf(raw_content).pages)
+
+        if page_count < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACTION_WORKERS < 2:
+            return "\n".join(extract_pdf_pages(raw_content, 0, page_count))
+
+        # One contiguous page range per worker, so the file is sent to every process only once
+        range_size = -(-page_count // PDF_EXTRACTION_WORKERS)
+        futures = [
+            pdf_executor.submit(extract_pdf_pages, raw_content, start, min(start + range_size, page_count))
+            for start in range(0, page_count, range_size)
+        ]
+        return "\n".join(page for future in futures for page in future.result())
+
+    def file_handler(self, file: Optional[CustomFileModel]) -> Optional[str]:
         try:
 
             # TODO: add docx file type
             if file:
-                if file.file_type == "text/plain":
-                    decoded_content = base64.b64decode(file.file_content).decode("utf-8")
-                elif file.file_type == "application/pdf":
-                    decoded_content = base64.b64decode(file.file_content)
-                    pdf_reader = PdfReader(io.BytesIO(decoded_content))
-                    decoded_content = "\n".join([page.extract_text() for page in pdf_reader.pages])
-                else:
+                if file.file_type not in SUPPORTED_FILE_TYPES:
                     logger.warning(f"The provided file could not be handled.")
-                    return all_documents
-
-                # Generate a unique filename for the CSV
-                csv_file = generate_csv_filename_from_name(decoded_content)
+                    return None
 
-                if os.path.exists(csv_file):
-                    # If the CSV file already exists, read it
-                    df = pd.read_csv(csv_file)
-                else:
-                    # If the CSV file does not exist, generate it
-                    df = self.generate_csv_from_file(csv_file, decoded_content)
+                # The cache is checked with the hash of the uploaded bytes before any text is extracted
+                raw_content = base64.b64decode(file.file_content)
+                raw_hash = generate_document_hash(raw_content)
 
-                all_documents.extend(df["text"].tolist())
+                return self.document_file_handler(raw_content, file.file_type, raw_hash)
 
-            return all_documents
+            return None
         except Exception as e:
             logger.opt(exception=e).error(
-                f"An error occurred while handling the CSV file"
+                f"An error occurred while handling the file"
             )
+            return None
 
-    def generate_csv_from_file(self, csv_file: str, file_content: str) -> pd.DataFrame:
+    def document_file_handler(self, source: Union[bytes, str], file_type: str, raw_hash: str) -> Optional[str]:
         try:
-            # Clean the text content
-            cleaned_content = clean_text(file_content)
-
-            # Split the cleaned content into documents (for simplicity, we assume each line is a document)
-            documents = [{"text": line} for line in cleaned_content.split("\n") if line]
-
-            # Add the documents to a DataFrame and save it as a CSV file
-            df = pd.DataFrame(documents)
-            df.drop_duplicates(subset=["text"], inplace=True)
-            df.to_csv(csv_file, index=False)
-            return df
+            # The source is either the uploaded bytes or the path of a spooled upload
+            document_hash = self.lookup_document_hash(raw_hash)
+            if document_hash and chunk_store_service.exists(document_hash):
+                return document_hash
+
+            if file_type == "text/plain" and isinstance(source, bytes):
+                decoded_content = source.decode("utf-8")
+            elif file_type == "text/plain":
+                with open(source, encoding="utf-8") as f:
+                    decoded_content = f.read()
+            elif file_type == "application/pdf":
+                decoded_content = self.extract_pdf_text(source)
+            else:
+                logger.warning(f"The provided file could not be handled.")
+                return None
+
+            document_hash = generate_document_hash(decoded_content)
+            if not chunk_store_service.exists(document_hash):
+                self.ingest_document_content(document_hash, decoded_content)
+
+            self.store_document_hash(raw_hash, document_hash)
+
+            return document_hash
         except Exception as e:
-            logger.opt(exception=e).info(
-                f"An error occurred while generating the CSV file from the file content"
+            logger.opt(exception=e).error(
+                f"An error occurred while handling the document file"
             )
-            return pd.DataFrame()
+            return None
+
+    def ingest_document_content(self, document_hash: str, file_content: str) -> None:
+        # Clean the text content
+        cleaned_content = clean_text(file_content)
+
+        # Split the cleaned content into documents (for simplicity, we assume each line is a document), keeping the first of each duplicate
+        documents = list(dict.fromkeys(line for line in cleaned_content.split("\n") if line))
+
+        # The chunks are stored once, requests only read the rows the lexical search returns
+        chunked_documents = self.chunk_handler(documents)
+        lexical_index_service.get_or_build(document_hash, chunked_documents)
+        chunk_store_service.write(document_hash, chunked_documents)
+
+        for evicted_hash in chunk_store_service.enforce_budget(keep=document_hash):
+            lexical_index_service.forget(evicted_hash)
 
     def chunk_handler(self, all_documents: list):
         try:
@@ -111,65 +148,31 @@ class FileHandlerService:
         except Exception as e:
             logger.opt(exception=e).error(f"An error occurred while handling chunks")
 
-    def knn_search(self, documents: list[str], query: str, k: int = 5):
+    def knn_search(self, document_hash: str, query: str, k: int = 5):
         try:
+            # The TF-IDF index of a document is fitted at ingestion and then only queried, None means it is missing
+            lexical_index = lexical_index_service.get(document_hash)
+            if lexical_index is None:
+                return None
 
-            tfidf_matrix = self.vectorizer.fit_transform(documents)
-
-            num_documents = tfidf_matrix.shape[0]
-            k = min(k, num_documents)
-            knn = NearestNeighbors(n_neighbors=k, metric="cosine")
-            knn.fit(tfidf_matrix)
-
-            query_tfidf = self.vectorizer.transform([clean_text(query)])
-            distances, indices = knn.kneighbors(query_tfidf)
-
-            return indices.flatten()
+            return lexical_index.search(query, k)
         except Exception as e:
             logger.opt(exception=e).error(f"An error occurred while performing KNN search")
+            raise e
 
 
     def document_encoding_service(
             self, collection: Collection, relevant_documents: list[Union[str, list[str]]]
     ) -> Optional[Chroma]:
         try:
-            # Generate unique IDs for each document chunk
-            ids = [str(uuid.uuid4()) for _ in range(len(relevant_documents))]
-
-            # Split chunked_documents into batches
-            def encode_documents_batch(documents_batch):
-                return self.model_transformer.encode(documents_batch).tolist()
-
-            document_batches = [
-                relevant_documents[i : i + BATCH_SIZE]
-                for i in range(0, len(relevant_documents), BATCH_SIZE)
-            ]
-
-            # Use ThreadPoolExecutor to encode document batches concurrently
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                futures = [
-                    executor.submit(encode_documents_batch, batch)
-                    for batch in document_batches
-                ]
-                document_embeddings = [
-                    embedding
-                    for future in concurrent.futures.as_completed(futures)
-                    for embedding in future.result()
-                ]
-            executor.shutdown(wait=True)
+            # Chunks already stored in the deck's collection keep their content hash id and are not encoded again
+            relevant_documents = vector_index_service.missing_chunks(collection, relevant_documents)
 
-            # Store the document chunks and their embeddings in the database
-            collection.upsert(
-                documents=relevant_documents,
-                embeddings=document_embeddings,
-                ids=ids,
-            )
+            document_embeddings = embedding_service.embed_documents(relevant_documents)
 
-            vector_db = Chroma(
-                collection_name="collection",
-                embedding_function=HuggingFaceEmbeddings(),
-            )
+            # Store the document chunks and their embeddings in the database
+            vector_index_service.upsert_chunks(collection, relevant_documents, document_embeddings)
 
-            return vector_db
+            return vector_index_service.get_vectorstore(collection)
         except Exception as e:
             logger.opt(exception=e).error(f"An error occurred while encoding documents")
\ No newline at end of file
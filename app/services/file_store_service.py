@@ -0,0 +1,113 @@
+import base64
+import os
+import threading
+import time
+from typing import Optional
+
+from cachetools import TTLCache
+from loguru import logger
+from pydantic import BaseModel
+
+from app.config.document_config import (
+    FILE_STORE_DIRECTORY,
+    FILE_STORE_MAX_BYTES,
+    FILE_STORE_MAX_REFERENCES,
+    FILE_STORE_TTL,
+)
+from app.model.dto.request_model_dto import CustomFileModel
+from app.utils.utils import generate_document_hash
+
+
+class StoredFile(BaseModel):
+    raw_hash: str
+    file_type: str
+
+
+class FileStoreService:
+    def __init__(self, directory: str, max_bytes: int, ttl: float, max_references: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Only these small references stay in memory, the file bodies live on disk
+        self.references: TTLCache = TTLCache(maxsize=max_references, ttl=ttl)
+        # Keys whose body the budget evicted, the client is asked to upload the file again instead of getting cards without it
+        self.evicted: TTLCache = TTLCache(maxsize=max_references, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def body_path(self, stored_file: StoredFile) -> str:
+        return os.path.join(self.directory, stored_file.raw_hash)
+
+    def get(self, unique_key: str) -> Optional[StoredFile]:
+        with self.lock:
+            stored_file = self.references.get(unique_key)
+        if not stored_file:
+            return None
+
+        # The body's mtime is the recency the eviction works with
+        try:
+            os.utime(self.body_path(stored_file))
+        except FileNotFoundError:
+            # The budget evicted the body, the reference would only point at nothing
+            with self.lock:
+                self.references.pop(unique_key, None)
+                self.evicted[unique_key] = True
+            logger.info(f"Dropped the reference to the evicted stored file {stored_file.raw_hash}")
+            return None
+        return stored_file
+
+    def was_evicted(self, unique_key: str) -> bool:
+        with self.lock:
+            return unique_key in self.evicted
+
+    def put(self, unique_key: str, file: CustomFileModel) -> StoredFile:
+        raw_content = base64.b64decode(file.file_content)
+        stored_file = StoredFile(raw_hash=generate_document_hash(raw_content), file_type=file.file_type)
+        body_path = self.body_path(stored_file)
+
+        # Identical uploads from different sessions share one body
+        if os.path.exists(body_path):
+            os.utime(body_path)
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary_path = f"{body_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary_path, "wb") as body_file:
+                body_file.write(raw_content)
+            os.replace(temporary_path, body_path)
+
+        with self.lock:
+            self.references[unique_key] = stored_file
+            self.evicted.pop(unique_key, None)
+
+        self.enforce_budget(keep=stored_file.raw_hash)
+        return stored_file
+
+    def enforce_budget(self, keep: Optional[str] = None) -> None:
+        now = time.time()
+        bodies = []
+        total_size = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            stat = entry.stat()
+            bodies.append((stat.st_mtime, entry.name, stat.st_size))
+            total_size += stat.st_size
+
+        # Oldest first: expired bodies always go, the rest only while the store is above its budget
+        evicted = 0
+        for modified, raw_hash, size in sorted(bodies):
+            if raw_hash == keep:
+                continue
+            if now - modified <= self.ttl and total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, raw_hash))
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            evicted += 1
+
+        if evicted:
+            logger.info(f"Evicted {evicted} stored files to stay within the file store budget")
+
+
+file_store_service = FileStoreService(FILE_STORE_DIRECTORY, FILE_STORE_MAX_BYTES, FILE_STORE_TTL, FILE_STORE_MAX_REFERENCES)
\ No newline at end of file
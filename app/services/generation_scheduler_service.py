@@ -0,0 +1,77 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, TypeVar
+
+from app.config.generation_config import (
+    GENERATION_EXECUTOR_WORKERS,
+    GENERATION_MAX_CONCURRENT,
+    GENERATION_MAX_CONCURRENT_PER_SESSION,
+    GENERATION_QUEUE_TIMEOUT,
+)
+
+T = TypeVar("T")
+
+generation_executor = ThreadPoolExecutor(
+    max_workers=GENERATION_EXECUTOR_WORKERS, thread_name_prefix="generation"
+)
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(generation_executor, functools.partial(func, *args, **kwargs))
+
+
+class GenerationQueueTimeoutError(Exception):
+    pass
+
+
+class GenerationLimiter:
+    def __init__(self, max_concurrent: int, max_concurrent_per_session: int, queue_timeout: float):
+        self.max_concurrent_per_session = max_concurrent_per_session
+        self.queue_timeout = queue_timeout
+        self.global_semaphore = asyncio.Semaphore(max_concurrent)
+        self.session_semaphores: dict[str, asyncio.Semaphore] = {}
+        self.session_waiters: dict[str, int] = {}
+
+    async def _acquire(self, session_semaphore: asyncio.Semaphore) -> None:
+        await session_semaphore.acquire()
+        try:
+            await self.global_semaphore.acquire()
+        except BaseException:
+            session_semaphore.release()
+            raise
+
+    @asynccontextmanager
+    async def acquire(self, session_uuid: str) -> AsyncIterator[None]:
+        if session_uuid not in self.session_semaphores:
+            self.session_semaphores[session_uuid] = asyncio.Semaphore(self.max_concurrent_per_session)
+            self.session_waiters[session_uuid] = 0
+        session_semaphore = self.session_semaphores[session_uuid]
+        self.session_waiters[session_uuid] += 1
+
+        try:
+            try:
+                await asyncio.wait_for(self._acquire(session_semaphore), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise GenerationQueueTimeoutError(
+                    f"Waited more than {self.queue_timeout}s for a free card generation slot"
+                )
+
+            try:
+                yield
+            finally:
+                self.global_semaphore.release()
+                session_semaphore.release()
+        finally:
+            # Drop the per-session semaphore once nobody uses it, so the dict doesn't grow with every session
+            self.session_waiters[session_uuid] -= 1
+            if self.session_waiters[session_uuid] == 0:
+                del self.session_waiters[session_uuid]
+                del self.session_semaphores[session_uuid]
+
+
+generation_limiter = GenerationLimiter(
+    GENERATION_MAX_CONCURRENT, GENERATION_MAX_CONCURRENT_PER_SESSION, GENERATION_QUEUE_TIMEOUT
+)
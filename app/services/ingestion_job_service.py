@@ -0,0 +1,92 @@
+import os
+import threading
+import uuid as uuid_module
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from cachetools import TTLCache
+from loguru import logger
+
+from app.config.document_config import INGESTION_WORKERS, INGESTION_JOB_RETENTION, INGESTION_JOB_TTL
+from app.model.dto.answer_model_dto import IngestionJobDTO
+from app.model.dto.request_model_dto import CustomFileModel
+from app.services.chunk_store_service import chunk_store_service
+from app.services.embedding_service import embedding_service
+from app.services.file_handler_service import FileHandlerService
+
+
+class IngestionJobService:
+    def __init__(self, workers: int, retention: int, ttl: float):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingestion")
+        # Queued and running jobs are never evicted, only finished ones expire or make room for newer ones
+        self.active_jobs: dict[str, IngestionJobDTO] = {}
+        self.finished_jobs: TTLCache = TTLCache(maxsize=retention, ttl=ttl)
+        self.lock = threading.Lock()
+        self.file_handler_service = FileHandlerService()
+
+    def _update(self, job_id: str, **changes) -> None:
+        with self.lock:
+            job = self.active_jobs.get(job_id)
+            if job is None:
+                return
+            job = job.model_copy(update=changes)
+            if job.status in ("done", "failed"):
+                del self.active_jobs[job_id]
+                self.finished_jobs[job_id] = job
+            else:
+                self.active_jobs[job_id] = job
+
+    def _run(self, job_id: str, ingest_document: Callable[[], Optional[str]]) -> None:
+        try:
+            self._update(job_id, status="running", stage="parsing", progress=0.1)
+            document_hash = ingest_document()
+            if not document_hash:
+                self._update(job_id, status="failed", error="The file could not be parsed or contains no text")
+                return
+
+            # Warming the embedding cache means generation only pays for the search, not the transformer
+            self._update(job_id, stage="embedding", progress=0.7)
+            chunk_store = chunk_store_service.open(document_hash)
+            embedding_service.embed_documents(chunk_store.read_all())
+
+            self._update(job_id, status="done", stage="", progress=1.0, document_id=document_hash)
+            logger.info(f"Ingestion job {job_id} finished for document {document_hash}")
+        except Exception as e:
+            logger.opt(exception=e).error(f"An error occurred while ingesting a document")
+            self._update(job_id, status="failed", error="An Internal Server Error occurred")
+
+    def _submit(self, ingest_document: Callable[[], Optional[str]], cleanup: Optional[Callable[[], None]] = None) -> IngestionJobDTO:
+        job = IngestionJobDTO(job_id=str(uuid_module.uuid4()))
+        with self.lock:
+            self.active_jobs[job.job_id] = job
+
+        future = self.executor.submit(self._run, job.job_id, ingest_document)
+        if cleanup:
+            # Done callbacks also run for jobs that are cancelled at shutdown before they started
+            future.add_done_callback(lambda _: cleanup())
+        return job
+
+    def submit(self, file: CustomFileModel) -> IngestionJobDTO:
+        return self._submit(lambda: self.file_handler_service.file_handler(file))
+
+    def submit_upload(self, upload_path: str, file_type: str, raw_hash: str) -> IngestionJobDTO:
+        def remove_upload() -> None:
+            # Only the extracted text is kept, the spooled upload is not needed anymore
+            try:
+                os.remove(upload_path)
+            except FileNotFoundError:
+                pass
+
+        return self._submit(
+            lambda: self.file_handler_service.document_file_handler(upload_path, file_type, raw_hash), remove_upload
+        )
+
+    def get(self, job_id: str) -> Optional[IngestionJobDTO]:
+        with self.lock:
+            return self.active_jobs.get(job_id) or self.finished_jobs.get(job_id)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+ingestion_job_service = IngestionJobService(INGESTION_WORKERS, INGESTION_JOB_RETENTION, INGESTION_JOB_TTL)
\ No newline at end of file
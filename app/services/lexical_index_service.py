@@ -0,0 +1,118 @@
+import os
+import re
+import threading
+from typing import Optional
+
+import joblib
+import numpy as np
+from cachetools import LRUCache
+from loguru import logger
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.config.document_config import DOCUMENT_DIRECTORY, LEXICAL_INDEX_CACHE_SIZE
+from app.utils.utils import clean_text
+
+
+class LexicalIndex:
+    def __init__(self, vectorizer: TfidfVectorizer, matrix: sparse.csr_matrix):
+        # Never mutated after construction, so concurrent searches need no locking
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+
+    @classmethod
+    def build(cls, chunks: list[str]) -> "LexicalIndex":
+        vectorizer = TfidfVectorizer()
+        matrix = vectorizer.fit_transform(chunks).tocsr()
+        return cls(vectorizer, matrix)
+
+    def search(self, query: str, k: int = 5) -> list[int]:
+        k = min(k, self.matrix.shape[0])
+        if k == 0:
+            return []
+
+        # TF-IDF rows are L2 normalised, so the dot product is the cosine similarity
+        query_tfidf = self.vectorizer.transform([clean_text(query)])
+        scores = (self.matrix @ query_tfidf.T).toarray().ravel()
+
+        top_indices = np.argpartition(-scores, k - 1)[:k]
+        return top_indices[np.argsort(-scores[top_indices], kind="stable")].tolist()
+
+
+class LexicalIndexService:
+    def __init__(self, directory: str, cache_size: int):
+        self.directory = directory
+        self.indexes: LRUCache = LRUCache(maxsize=cache_size)
+        self.lock = threading.Lock()
+        self.build_locks: dict[str, threading.Lock] = {}
+
+    def _index_directory(self, document_hash: str) -> str:
+        return os.path.join(self.directory, document_hash)
+
+    def _load(self, document_hash: str) -> Optional[LexicalIndex]:
+        index_directory = self._index_directory(document_hash)
+        if not os.path.exists(os.path.join(index_directory, "tfidf.npz")):
+            return None
+
+        try:
+            vectorizer = joblib.load(os.path.join(index_directory, "vectorizer.joblib"))
+            matrix = sparse.load_npz(os.path.join(index_directory, "tfidf.npz")).tocsr()
+            return LexicalIndex(vectorizer, matrix)
+        except (OSError, ValueError) as e:
+            logger.opt(exception=e).warning(f"The lexical index of {document_hash} could not be loaded")
+            return None
+
+    def _save(self, document_hash: str, index: LexicalIndex) -> None:
+        index_directory = self._index_directory(document_hash)
+        os.makedirs(index_directory, exist_ok=True)
+
+        joblib.dump(index.vectorizer, os.path.join(index_directory, "vectorizer.joblib"))
+        # The matrix is written last, it marks the index as complete for _load
+        temporary_path = os.path.join(index_directory, f"tfidf.{os.getpid()}.{threading.get_ident()}.tmp.npz")
+        sparse.save_npz(temporary_path, index.matrix)
+        os.replace(temporary_path, os.path.join(index_directory, "tfidf.npz"))
+
+    def forget(self, document_hash: str) -> None:
+        with self.lock:
+            self.indexes.pop(document_hash, None)
+
+    def get(self, document_hash: str) -> Optional[LexicalIndex]:
+        # Document ids come from clients and end up in a path, so only md5 hex digests are accepted
+        if not re.fullmatch(r"[0-9a-f]{32}", document_hash):
+            return None
+
+        with self.lock:
+            index = self.indexes.get(document_hash)
+        if index is not None:
+            return index
+
+        index = self._load(document_hash)
+        if index is not None:
+            with self.lock:
+                self.indexes[document_hash] = index
+        return index
+
+    def get_or_build(self, document_hash: str, chunks: list[str]) -> LexicalIndex:
+        index = self.get(document_hash)
+        if index is not None:
+            return index
+
+        with self.lock:
+            build_lock = self.build_locks.setdefault(document_hash, threading.Lock())
+
+        # Concurrent requests for the same new document wait for one build instead of fitting it twice
+        with build_lock:
+            with self.lock:
+                index = self.indexes.get(document_hash)
+            if index is None:
+                index = LexicalIndex.build(chunks)
+                self._save(document_hash, index)
+                with self.lock:
+                    self.indexes[document_hash] = index
+
+        with self.lock:
+            self.build_locks.pop(document_hash, None)
+        return index
+
+
+lexical_index_service = LexicalIndexService(DOCUMENT_DIRECTORY, LEXICAL_INDEX_CACHE_SIZE)
\ No newline at end of file
@@ -0,0 +1,45 @@
+from loguru import logger
+from sqlalchemy import Engine, text
+
+from app.migrations import MIGRATIONS
+
+# Arbitrary but fixed, every worker uses it so only one of them migrates at a time
+MIGRATION_LOCK_KEY = 7312025018
+
+
+def apply_migrations(engine: Engine) -> None:
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()
+        try:
+            connection.execute(text(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description VARCHAR NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """
+            ))
+            connection.commit()
+
+            applied_versions = set(connection.scalars(text("SELECT version FROM schema_migrations")))
+
+            for migration in MIGRATIONS:
+                if migration.VERSION in applied_versions:
+                    continue
+
+                # Each migration runs in its own transaction, a failing one leaves the schema at the previous version
+                for statement in migration.STATEMENTS:
+                    connection.execute(text(statement))
+                connection.execute(
+                    text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                    {"version": migration.VERSION, "description": migration.DESCRIPTION},
+                )
+                connection.commit()
+                logger.info(f"Applied migration {migration.VERSION}: {migration.DESCRIPTION}")
+
+        finally:
+            connection.rollback()
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            connection.commit()
\ No newline at end of file
@@ -0,0 +1,71 @@
+import threading
+from typing import Optional
+
+from cachetools import TTLCache
+
+from app.config.database_connection_config import RESOLUTION_CACHE_SIZE, RESOLUTION_CACHE_TTL
+
+
+class ResolutionCache:
+    def __init__(self, size: int, ttl: float):
+        # Only positive results are cached, a session or deck created meanwhile is never hidden
+        self.sessions: TTLCache = TTLCache(maxsize=size, ttl=ttl)
+        self.deck_ids: TTLCache = TTLCache(maxsize=size, ttl=ttl)
+        self.lock = threading.Lock()
+        self.session_hits = 0
+        self.session_misses = 0
+        self.deck_hits = 0
+        self.deck_misses = 0
+
+    def has_session(self, session_uuid: str) -> bool:
+        with self.lock:
+            found = session_uuid in self.sessions
+            if found:
+                self.session_hits += 1
+            else:
+                self.session_misses += 1
+            return found
+
+    def put_session(self, session_uuid: str) -> None:
+        with self.lock:
+            self.sessions[session_uuid] = True
+
+    def invalidate_session(self, session_uuid: str) -> None:
+        with self.lock:
+            self.sessions.pop(session_uuid, None)
+
+    def get_deck_id(self, session_uuid: str, deck_name: str) -> Optional[int]:
+        with self.lock:
+            deck_id = self.deck_ids.get((session_uuid, deck_name))
+            if deck_id is not None:
+                self.deck_hits += 1
+            else:
+                self.deck_misses += 1
+            return deck_id
+
+    def put_deck_id(self, session_uuid: str, deck_name: str, deck_id: int) -> None:
+        with self.lock:
+            self.sessions[session_uuid] = True
+            self.deck_ids[(session_uuid, deck_name)] = deck_id
+
+    def invalidate_deck(self, session_uuid: str, deck_name: str) -> None:
+        with self.lock:
+            self.deck_ids.pop((session_uuid, deck_name), None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            session_lookups = self.session_hits + self.session_misses
+            deck_lookups = self.deck_hits + self.deck_misses
+            return {
+                "sessions": len(self.sessions),
+                "decks": len(self.deck_ids),
+                "session_hits": self.session_hits,
+                "session_misses": self.session_misses,
+                "session_hit_ratio": self.session_hits / session_lookups if session_lookups else 0.0,
+                "deck_hits": self.deck_hits,
+                "deck_misses": self.deck_misses,
+                "deck_hit_ratio": self.deck_hits / deck_lookups if deck_lookups else 0.0,
+            }
+
+
+resolution_cache = ResolutionCache(RESOLUTION_CACHE_SIZE, RESOLUTION_CACHE_TTL)
\ No newline at end of file
@@ -0,0 +1,210 @@
+from typing import NamedTuple, Optional
+
+from sqlalchemy import Integer, Row, String, Text, and_, bindparam, column, delete, func, insert, literal, select, update, values
+from sqlalchemy.dialects.postgresql import insert as upsert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession as Db_session
+
+from app.model.dao.deck_model_dao import Card, Deck, Session
+from app.services.resolution_cache_service import resolution_cache
+
+# Columns returned for a card by every write, named like the CardDTO fields
+CARD_COLUMNS = (Card.card_uuid, Card.card_front, Card.card_back, Card.last_learned, Card.next_learned, Card.stage)
+
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+class DeckResolution(NamedTuple):
+    session_found: bool
+    deck_id: Optional[int]
+    version: Optional[int] = None
+
+
+def deck_of_session(session_uuid: str, deck_name: str):
+    return and_(Deck.session_uuid == session_uuid, Deck.deck_name == deck_name)
+
+
+async def resolve_deck(db: Db_session, session_uuid: str, deck_name: str) -> DeckResolution:
+    # The outer join tells a missing session (no row) apart from a missing deck (no deck id) in one round-trip
+    row = (await db.execute(
+        select(Session.id, Deck.id, Deck.version)
+        .select_from(Session)
+        .outerjoin(Deck, and_(Deck.session_uuid == Session.session_uuid, Deck.deck_name == deck_name))
+        .where(Session.session_uuid == session_uuid)
+    )).first()
+
+    if row is None:
+        return DeckResolution(session_found=False, deck_id=None)
+    return DeckResolution(session_found=True, deck_id=row[1], version=row[2])
+
+
+async def resolve_deck_cached(db: Db_session, session_uuid: str, deck_name: str) -> DeckResolution:
+    # Deck ids hardly ever change, a cached one skips the lookup (the version is not cached and stays unset)
+    deck_id = resolution_cache.get_deck_id(session_uuid, deck_name)
+    if deck_id is not None:
+        return DeckResolution(session_found=True, deck_id=deck_id)
+
+    resolution = await resolve_deck(db, session_uuid, deck_name)
+    if resolution.deck_id:
+        resolution_cache.put_deck_id(session_uuid, deck_name, resolution.deck_id)
+    elif resolution.session_found:
+        resolution_cache.put_session(session_uuid)
+    return resolution
+
+
+async def refresh_deck(db: Db_session, session_uuid: str, deck_name: str) -> DeckResolution:
+    # Another worker may have deleted the deck behind a cached id, the database has the last word
+    resolution_cache.invalidate_deck(session_uuid, deck_name)
+    return await resolve_deck_cached(db, session_uuid, deck_name)
+
+
+def is_foreign_key_violation(e: IntegrityError) -> bool:
+    return getattr(e.orig, "sqlstate", None) == FOREIGN_KEY_VIOLATION
+
+
+async def select_deck_cards(db: Db_session, deck_id: int, fields: list[str], after: Optional[int], limit: Optional[int]) -> list[Row]:
+    # Keyset pagination on (deck_id, id), a page costs the same no matter how deep into the deck it is
+    query = select(Card.id, *[getattr(Card, field) for field in fields]).where(Card.deck_id == deck_id)
+    if after is not None:
+        query = query.where(Card.id > after)
+    query = query.order_by(Card.id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return list((await db.execute(query)).all())
+
+
+async def resolve_session_decks(db: Db_session, session_uuid: str) -> tuple[bool, list[str]]:
+    rows = (await db.execute(
+        select(Deck.deck_name)
+        .select_from(Session)
+        .outerjoin(Deck, Deck.session_uuid == Session.session_uuid)
+        .where(Session.session_uuid == session_uuid)
+        .order_by(Deck.id)
+    )).all()
+
+    return bool(rows), [deck_name for deck_name, in rows if deck_name is not None]
+
+
+async def insert_deck(db: Db_session, session_uuid: str, deck_name: str) -> Optional[int]:
+    # Inserts nothing when the session is missing or the deck already exists
+    return await db.scalar(
+        upsert(Deck)
+        .from_select(
+            [Deck.deck_name, Deck.session_uuid],
+            select(literal(deck_name), Session.session_uuid).where(Session.session_uuid == session_uuid),
+        )
+        .on_conflict_do_nothing(index_elements=[Deck.session_uuid, Deck.deck_name])
+        .returning(Deck.id)
+    )
+
+
+async def delete_deck(db: Db_session, session_uuid: str, deck_name: str) -> bool:
+    # Both deletes run in one statement, the foreign key is only checked once the cards are gone as well
+    deleted_deck = delete(Deck).where(deck_of_session(session_uuid, deck_name)).returning(Deck.id).cte("deleted_deck")
+    deleted_cards = delete(Card).where(Card.deck_id.in_(select(deleted_deck.c.id))).cte("deleted_cards")
+
+    deck_id = await db.scalar(select(deleted_deck.c.id).add_cte(deleted_cards))
+    return deck_id is not None
+
+
+async def insert_card(db: Db_session, session_uuid: str, deck_name: str, card_uuid: str, card_front: str, card_back: str, last_learned: str, next_learned: str) -> Optional[Row]:
+    return (await db.execute(
+        insert(Card)
+        .from_select(
+            [
+                Card.card_uuid, Card.card_front, Card.card_back, Card.last_learned, Card.next_learned, Card.stage,
+                Card.last_learned_at, Card.next_due, Card.deck_id,
+            ],
+            select(
+                literal(card_uuid), literal(card_front), literal(card_back),
+                literal(last_learned), literal(next_learned), literal(0),
+                # A card created with a schedule in the string columns is due when they say, like after an update
+                func.try_timestamptz(last_learned), func.coalesce(func.try_timestamptz(next_learned), func.now()), Deck.id,
+            ).where(deck_of_session(session_uuid, deck_name)),
+        )
+        .returning(*CARD_COLUMNS)
+    )).first()
+
+
+async def update_card(db: Db_session, session_uuid: str, deck_name: str, card_uuid: str, **values) -> Optional[Row]:
+    return (await db.execute(
+        update(Card)
+        .where(Card.deck_id == Deck.id, deck_of_session(session_uuid, deck_name), Card.card_uuid == card_uuid)
+        .values(
+            **values,
+            # Clients that still schedule through the string columns keep the due queue up to date
+            last_learned_at=func.coalesce(func.try_timestamptz(values["last_learned"]), Card.last_learned_at),
+            next_due=func.coalesce(func.try_timestamptz(values["next_learned"]), Card.next_due),
+        )
+        .returning(*CARD_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )).first()
+
+
+async def delete_card(db: Db_session, session_uuid: str, deck_name: str, card_uuid: str) -> bool:
+    card_id = await db.scalar(
+        delete(Card)
+        .where(Card.deck_id == Deck.id, deck_of_session(session_uuid, deck_name), Card.card_uuid == card_uuid)
+        .returning(Card.id)
+        .execution_options(synchronize_session=False)
+    )
+    return card_id is not None
+
+
+async def insert_cards(db: Db_session, deck_id: int, cards: list[dict]) -> list[Row]:
+    # One multi-row INSERT, the returned rows come back in the order of the given cards.
+    # The schedule binds need names of their own, the column names are taken by the VALUES clause
+    return list((await db.execute(
+        insert(Card)
+        .values(
+            last_learned_at=func.try_timestamptz(bindparam("last_learned_text")),
+            next_due=func.coalesce(func.try_timestamptz(bindparam("next_learned_text")), func.now()),
+        )
+        .returning(*CARD_COLUMNS, sort_by_parameter_order=True),
+        [
+            {**card, "deck_id": deck_id, "stage": 0, "last_learned_text": card["last_learned"], "next_learned_text": card["next_learned"]}
+            for card in cards
+        ],
+    )).all())
+
+
+async def update_cards(db: Db_session, deck_id: int, cards: list[dict]) -> list[Row]:
+    # The new values are joined in as a VALUES list, so all cards are updated by a single UPDATE ... FROM
+    card_values = values(
+        column("card_uuid", String),
+        column("card_front", Text),
+        column("card_back", Text),
+        column("last_learned", String),
+        column("next_learned", String),
+        column("stage", Integer),
+        name="card_values",
+    ).data([
+        (card["card_uuid"], card["card_front"], card["card_back"], card["last_learned"], card["next_learned"], card["stage"])
+        for card in cards
+    ])
+
+    return list((await db.execute(
+        update(Card)
+        .where(Card.deck_id == deck_id, Card.card_uuid == card_values.c.card_uuid)
+        .values(
+            card_front=card_values.c.card_front,
+            card_back=card_values.c.card_back,
+            last_learned=card_values.c.last_learned,
+            next_learned=card_values.c.next_learned,
+            stage=card_values.c.stage,
+            last_learned_at=func.coalesce(func.try_timestamptz(card_values.c.last_learned), Card.last_learned_at),
+            next_due=func.coalesce(func.try_timestamptz(card_values.c.next_learned), Card.next_due),
+        )
+        .returning(*CARD_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )).all())
+
+
+async def delete_cards(db: Db_session, deck_id: int, card_uuids: list[str]) -> set[str]:
+    return set((await db.scalars(
+        delete(Card)
+        .where(Card.deck_id == deck_id, Card.card_uuid.in_(card_uuids))
+        .returning(Card.card_uuid)
+        .execution_options(synchronize_session=False)
+    )).all())
\ No newline at end of file
@@ -0,0 +1,141 @@
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from cachetools import TTLCache
+
+from app.config.chat_model_config import (
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+)
+from app.services.embedding_service import embedding_service
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def context_hash(chunks: list[str]) -> str:
+    return hashlib.sha256("\0".join(chunks).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    answer: str
+    embedding: Optional[np.ndarray]
+    # Decks that already got this answer, serving it again would only repeat a card
+    served_to: set[str] = field(default_factory=set)
+
+
+class ResponseCache:
+    def __init__(self, size: int, ttl: float, similarity_threshold: float):
+        self.size = size
+        self.similarity_threshold = similarity_threshold
+        # Keyed by (model, prompt template hash, context hash, normalized question)
+        self.responses: TTLCache = TTLCache(maxsize=size, ttl=ttl)
+        # The similarity tier only compares questions of one (model, prompt template hash, context hash) bucket.
+        # Entries the TTL cache dropped are pruned from here when their bucket is scanned or the index outgrows it
+        self.buckets: dict[tuple, dict[str, CachedResponse]] = {}
+        self.bucket_entries = 0
+        self.lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @property
+    def similarity_enabled(self) -> bool:
+        return self.similarity_threshold < 1.0
+
+    def embed(self, question: str) -> Optional[np.ndarray]:
+        if not self.similarity_enabled:
+            return None
+        embedding = np.asarray(embedding_service.embed_query(question), dtype=np.float32)
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
+    def _live_candidates(self, bucket: tuple) -> list[tuple[str, CachedResponse]]:
+        candidates = self.buckets.get(bucket, {})
+        for normalized_question in [
+            normalized_question for normalized_question, candidate in candidates.items()
+            if self.responses.get(bucket + (normalized_question,)) is not candidate
+        ]:
+            del candidates[normalized_question]
+            self.bucket_entries -= 1
+        if not candidates:
+            self.buckets.pop(bucket, None)
+        return list(candidates.items())
+
+    def _rebuild_buckets(self) -> None:
+        self.buckets = {}
+        for key, cached_response in self.responses.items():
+            self.buckets.setdefault(key[:3], {})[key[3]] = cached_response
+        self.bucket_entries = len(self.responses)
+
+    def get(self, ai_model: str, prompt_template: str, context: str, question: str, unique_key: str) -> Optional[str]:
+        bucket = (ai_model, hashlib.sha256(prompt_template.encode()).hexdigest(), context)
+        normalized_question = normalize_question(question)
+
+        with self.lock:
+            cached_response = self.responses.get(bucket + (normalized_question,))
+            if cached_response and unique_key not in cached_response.served_to:
+                cached_response.served_to.add(unique_key)
+                self.exact_hits += 1
+                return cached_response.answer
+
+        if self.similarity_enabled:
+            embedding = self.embed(normalized_question)
+
+            with self.lock:
+                candidates = [
+                    (candidate_question, candidate) for candidate_question, candidate in self._live_candidates(bucket)
+                    if candidate.embedding is not None and unique_key not in candidate.served_to
+                ]
+
+            # The similarities are computed outside the lock, other lookups and writes do not wait for them
+            if candidates:
+                similarities = np.stack([candidate.embedding for _, candidate in candidates]) @ embedding
+                best_index = int(np.argmax(similarities))
+
+                if similarities[best_index] >= self.similarity_threshold:
+                    best_question, best_response = candidates[best_index]
+                    with self.lock:
+                        # The entry may have been replaced or served to this deck meanwhile
+                        if self.responses.get(bucket + (best_question,)) is best_response and unique_key not in best_response.served_to:
+                            best_response.served_to.add(unique_key)
+                            self.similar_hits += 1
+                            return best_response.answer
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, ai_model: str, prompt_template: str, context: str, question: str, unique_key: str, answer: str) -> None:
+        bucket = (ai_model, hashlib.sha256(prompt_template.encode()).hexdigest(), context)
+        normalized_question = normalize_question(question)
+        cached_response = CachedResponse(answer=answer, embedding=self.embed(normalized_question), served_to={unique_key})
+
+        with self.lock:
+            self.responses[bucket + (normalized_question,)] = cached_response
+
+            candidates = self.buckets.setdefault(bucket, {})
+            if normalized_question not in candidates:
+                self.bucket_entries += 1
+            candidates[normalized_question] = cached_response
+            if self.bucket_entries > 2 * self.size:
+                self._rebuild_buckets()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "entries": len(self.responses),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY_THRESHOLD)
\ No newline at end of file
@@ -0,0 +1,140 @@
+import asyncio
+from typing import Optional
+
+from loguru import logger
+
+from app.config.card_config import REVIEW_FLUSH_INTERVAL, REVIEW_FLUSH_MAX_PENDING, REVIEW_BUFFER_MAX_RESULTS
+from app.model.dto.request_model_dto import ReviewResultDTO
+from app.services.database_service import AsyncSessionLocal
+from app.services.review_service import apply_review_results
+
+
+class ReviewBuffer:
+    def __init__(self, flush_interval: float, max_pending: int, max_results: int):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_results = max_results
+        # Only the newest result per card is kept, keyed by (session_uuid, deck_name, card_uuid)
+        self.pending: dict[tuple[str, str, str], ReviewResultDTO] = {}
+        # Results of the batch that is being written, they come back into pending if the write fails
+        self.in_flight = 0
+        self.flush_lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+        self.size_flush_task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def add(self, session_uuid: str, deck_name: str, review_result_dto: ReviewResultDTO) -> bool:
+        key = (session_uuid, deck_name, review_result_dto.card_uuid)
+
+        # While the database is unreachable the buffer stops growing at max_results, the caller writes those synchronously
+        if key not in self.pending and len(self.pending) + self.in_flight >= self.max_results:
+            self.rejected += 1
+            return False
+
+        self.pending[key] = review_result_dto
+
+        if len(self.pending) >= self.max_pending and (not self.size_flush_task or self.size_flush_task.done()):
+            self.size_flush_task = asyncio.create_task(self.flush())
+        return True
+
+    async def discard(self, session_uuid: str, deck_name: str, card_uuids: list[str]) -> None:
+        # A direct write supersedes the buffered results of its cards, the next flush would overwrite it with them
+        keys = [(session_uuid, deck_name, card_uuid) for card_uuid in card_uuids]
+        for key in keys:
+            self.pending.pop(key, None)
+
+        if self.flush_lock.locked():
+            # The batch being written may hold the cards too, it is waited for in case it merges them back
+            async with self.flush_lock:
+                for key in keys:
+                    self.pending.pop(key, None)
+
+    async def flush(self, session_uuid: Optional[str] = None, deck_name: Optional[str] = None) -> None:
+        # Nothing buffered and nothing being written, readers do not have to queue behind the lock
+        if not self.pending and not self.in_flight:
+            return
+
+        async with self.flush_lock:
+            # Readers of one session or deck only need its results written, the rest waits for the next flush
+            if session_uuid is None:
+                batch, self.pending = self.pending, {}
+            else:
+                batch = {
+                    key: result for key, result in self.pending.items()
+                    if key[0] == session_uuid and (deck_name is None or key[1] == deck_name)
+                }
+                for key in batch:
+                    del self.pending[key]
+            if not batch:
+                return
+
+            # Results arriving while the batch is written go into the next one
+            self.in_flight = len(batch)
+            batch_items = list(batch.items())
+            written = 0
+            try:
+                async with AsyncSessionLocal() as db:
+                    # Every statement carries at most max_pending rows, a backlog after an outage stays below the bind parameter limit
+                    while written < len(batch_items):
+                        chunk = batch_items[written:written + self.max_pending]
+                        updated_cards = await apply_review_results(db, [
+                            (session_uuid, deck_name, card_uuid, result.stage, result.last_learned, result.next_learned)
+                            for (session_uuid, deck_name, card_uuid), result in chunk
+                        ])
+                        await db.commit()
+
+                        written += len(chunk)
+                        self.in_flight = len(batch_items) - written
+                        self.flushed += len(updated_cards)
+                        if len(updated_cards) < len(chunk):
+                            self.dropped += len(chunk) - len(updated_cards)
+                            logger.warning(f"Dropped {len(chunk) - len(updated_cards)} review results of cards that no longer exist")
+
+            except Exception as e:
+                self.failures += 1
+                logger.opt(exception=e).error(f"Flushing {len(batch_items) - written} review results failed, retrying with the next flush")
+                # Only the chunks that were not committed come back, newer results for the same card win over them
+                self.pending = {**dict(batch_items[written:]), **self.pending}
+                return
+            except asyncio.CancelledError:
+                # A flush interrupted at shutdown leaves its rows for the final flush in stop()
+                self.pending = {**dict(batch_items[written:]), **self.pending}
+                raise
+            finally:
+                self.in_flight = 0
+
+            self.flushes += 1
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        self.flush_task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+review_buffer = ReviewBuffer(REVIEW_FLUSH_INTERVAL, REVIEW_FLUSH_MAX_PENDING, REVIEW_BUFFER_MAX_RESULTS)
\ No newline at end of file
@@ -0,0 +1,86 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import ColumnElement, Integer, Interval, Row, String, case, cast, column, func, literal, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession as Db_session
+
+from app.config.card_config import REVIEW_INTERVAL_DAYS
+from app.model.dao.deck_model_dao import Card, Deck
+from app.services.resolution_service import CARD_COLUMNS, deck_of_session
+
+SCHEDULE_COLUMNS = (*CARD_COLUMNS, Card.last_learned_at, Card.next_due)
+
+
+def next_due_after(stage: ColumnElement) -> ColumnElement:
+    # Maps the (SQL) stage to its Leitner interval, stages past the last box keep the longest interval
+    return case(
+        {box: literal(datetime.timedelta(days=days), Interval) for box, days in enumerate(REVIEW_INTERVAL_DAYS)},
+        value=stage,
+        else_=literal(datetime.timedelta(days=REVIEW_INTERVAL_DAYS[-1]), Interval),
+    )
+
+
+async def select_due_cards(db: Db_session, session_uuid: str, deck_name: Optional[str], limit: int) -> list[Row]:
+    # Walks ix_cards_deck_id_next_due for every deck of the session, only the due rows are read
+    query = (
+        select(Deck.deck_name, *SCHEDULE_COLUMNS)
+        .join(Deck, Card.deck_id == Deck.id)
+        .where(Deck.session_uuid == session_uuid, Card.next_due <= func.now())
+    )
+    if deck_name is not None:
+        query = query.where(Deck.deck_name == deck_name)
+
+    return list((await db.execute(query.order_by(Card.next_due).limit(limit))).all())
+
+
+async def review_card(db: Db_session, session_uuid: str, deck_name: str, card_uuid: str, correct: bool) -> Optional[Row]:
+    # The new stage is computed from the stored one inside the UPDATE, so concurrent reviews never lose a step
+    new_stage = func.least(Card.stage + 1, len(REVIEW_INTERVAL_DAYS) - 1) if correct else literal(0)
+    next_due = func.now() + next_due_after(new_stage)
+
+    return (await db.execute(
+        update(Card)
+        .where(Card.deck_id == Deck.id, deck_of_session(session_uuid, deck_name), Card.card_uuid == card_uuid)
+        .values(
+            stage=new_stage,
+            last_learned_at=func.now(),
+            next_due=next_due,
+            # The legacy string columns mirror the schedule for clients that still read them
+            last_learned=cast(func.now(), String),
+            next_learned=cast(next_due, String),
+        )
+        .returning(*SCHEDULE_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )).first()
+
+
+async def apply_review_results(db: Db_session, review_results: list[tuple[str, str, str, int, str, str]]) -> list[Row]:
+    # Rows are (session_uuid, deck_name, card_uuid, stage, last_learned, next_learned), written by one UPDATE ... FROM
+    review_values = values(
+        column("session_uuid", String),
+        column("deck_name", String),
+        column("card_uuid", String),
+        column("stage", Integer),
+        column("last_learned", String),
+        column("next_learned", String),
+        name="review_values",
+    ).data(review_results)
+
+    return list((await db.execute(
+        update(Card)
+        .where(
+            Card.deck_id == Deck.id,
+            Deck.session_uuid == review_values.c.session_uuid,
+            Deck.deck_name == review_values.c.deck_name,
+            Card.card_uuid == review_values.c.card_uuid,
+        )
+        .values(
+            stage=review_values.c.stage,
+            last_learned=review_values.c.last_learned,
+            next_learned=review_values.c.next_learned,
+            last_learned_at=func.coalesce(func.try_timestamptz(review_values.c.last_learned), Card.last_learned_at),
+            next_due=func.coalesce(func.try_timestamptz(review_values.c.next_learned), Card.next_due),
+        )
+        .returning(*SCHEDULE_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )).all())
\ No newline at end of file
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+
+import chromadb
+from chromadb.api.models.Collection import Collection
+from chromadb.config import Settings
+from langchain_chroma import Chroma
+from loguru import logger
+
+from app.config.embedding_config import VECTOR_INDEX_DIRECTORY
+from app.services.embedding_service import embedding_service
+
+
+class VectorIndexService:
+    def __init__(self, directory: str):
+        self.client = chromadb.PersistentClient(path=directory, settings=Settings(anonymized_telemetry=False))
+        self.vectorstores: dict[str, Chroma] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def deck_prefix(session_uuid: str, deck_name: str) -> str:
+        return "deck-" + hashlib.md5(f"{session_uuid}\0{deck_name}".encode()).hexdigest()[:24]
+
+    @staticmethod
+    def chunk_id(chunk: str) -> str:
+        return hashlib.sha256(chunk.encode()).hexdigest()
+
+    def collection_name(self, session_uuid: str, deck_name: str, document_hash: str) -> str:
+        # Chroma allows at most 63 characters, the deck prefix keeps all documents of a deck deletable together
+        return f"{self.deck_prefix(session_uuid, deck_name)}-{document_hash[:32]}"
+
+    def get_collection(self, session_uuid: str, deck_name: str, document_hash: str) -> Collection:
+        return self.client.get_or_create_collection(
+            name=self.collection_name(session_uuid, deck_name, document_hash),
+            metadata={"session_uuid": session_uuid, "deck_name": deck_name, "document_hash": document_hash},
+        )
+
+    def missing_chunks(self, collection: Collection, chunks: list[str]) -> list[str]:
+        existing_ids = set(collection.get(ids=[self.chunk_id(chunk) for chunk in chunks], include=[])["ids"])
+        return [chunk for chunk in dict.fromkeys(chunks) if self.chunk_id(chunk) not in existing_ids]
+
+    def upsert_chunks(self, collection: Collection, chunks: list[str], embeddings: list[list[float]]) -> None:
+        if chunks:
+            collection.upsert(
+                documents=chunks,
+                embeddings=embeddings,
+                ids=[self.chunk_id(chunk) for chunk in chunks],
+            )
+
+    def get_vectorstore(self, collection: Collection) -> Chroma:
+        with self.lock:
+            if collection.name not in self.vectorstores:
+                self.vectorstores[collection.name] = Chroma(
+                    client=self.client,
+                    collection_name=collection.name,
+                    embedding_function=embedding_service,
+                )
+            return self.vectorstores[collection.name]
+
+    def delete_deck_collections(self, session_uuid: str, deck_name: str) -> None:
+        prefix = self.deck_prefix(session_uuid, deck_name)
+
+        for collection in self.client.list_collections():
+            # Newer chroma versions only return the names
+            collection_name = getattr(collection, "name", collection)
+            if not collection_name.startswith(prefix):
+                continue
+
+            with self.lock:
+                self.vectorstores.pop(collection_name, None)
+            self.client.delete_collection(collection_name)
+            logger.info(f"Deleted vector index {collection_name} of deck {deck_name}")
+
+
+vector_index_service = VectorIndexService(VECTOR_INDEX_DIRECTORY)
\ No newline at end of file
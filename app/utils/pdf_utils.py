@@ -0,0 +1,18 @@
+import io
+from typing import Union
+
+from PyPDF2 import PdfReader
+
+
+def open_pdf(source: Union[bytes, str]) -> PdfReader:
+
+    if isinstance(source, bytes):
+        return PdfReader(io.BytesIO(source))
+    return PdfReader(source)
+
+
+def extract_pdf_pages(source: Union[bytes, str], start: int, stop: int) -> list[str]:
+
+    # Runs in the extraction process pool, so this module must stay free of heavy imports
+    pdf_reader = open_pdf(source)
+    return [pdf_reader.pages[i].extract_text() for i in range(start, stop)]
\ No newline at end of file
@@ -1,7 +1,8 @@
 import hashlib
-import os
+import json
 import re
 import uuid as uuid_module
+from typing import Union
 
 from nltk import PorterStemmer
 
@@ -9,6 +10,8 @@ from app.model.dto.answer_model_dto import CardDTO
 
 stemmer = PorterStemmer()
 
+CARD_LINE_PREFIX_PATTERN = re.compile(r"^(?:[-*•]+|\d+[.):]|(?:flashcard|card)\s*\d*\s*[.):-])\s*", re.IGNORECASE)
+
 def clean_text(text: str) -> str:
 
     text = re.sub(r"\W", " ", text)
@@ -18,16 +21,12 @@ def clean_text(text: str) -> str:
     return text
 
 
-def generate_csv_filename_from_name(name: str) -> str:
-
-    hash_object = hashlib.md5(name.encode())
-    hex_dig = hash_object.hexdigest()
-    directory = "app/data"
+def generate_document_hash(content: Union[str, bytes]) -> str:
 
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-
-    return f"{directory}/{hex_dig}.csv"
+    if isinstance(content, str):
+        content = content.encode()
+    hash_object = hashlib.md5(content)
+    return hash_object.hexdigest()
 
 
 def generate_card_from_text(text: str) -> CardDTO:
@@ -37,4 +36,37 @@ def generate_card_from_text(text: str) -> CardDTO:
     except ValueError:
         raise ValueError("Input text must contain exactly one ';' character separating the question and answer.")
 
-    return CardDTO(card_front=question.strip(), card_back=answer.strip(), card_uuid=str(uuid_module.uuid4()), last_learned="", next_learned="", stage=0)
\ No newline at end of file
+    return CardDTO(card_front=question.strip(), card_back=answer.strip(), card_uuid=str(uuid_module.uuid4()), last_learned="", next_learned="", stage=0)
+
+
+def generate_cards_from_text(text: str) -> tuple[list[CardDTO], list[str]]:
+
+    cards = []
+    rejected_lines = []
+    seen_fronts = set()
+
+    for line in text.splitlines():
+        # Models like to decorate lists even when told not to, so strip bullets, numbering and code fences
+        line = CARD_LINE_PREFIX_PATTERN.sub("", line.strip())
+        if not line or line.startswith("```"):
+            continue
+
+        try:
+            card = generate_card_from_text(line)
+        except ValueError:
+            rejected_lines.append(line)
+            continue
+
+        if not card.card_front or not card.card_back or card.card_front.lower() in seen_fronts:
+            rejected_lines.append(line)
+            continue
+
+        seen_fronts.add(card.card_front.lower())
+        cards.append(card)
+
+    return cards, rejected_lines
+
+
+def format_sse_event(event: str, data: object) -> str:
+
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
\ No newline at end of file
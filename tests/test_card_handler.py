@@ -0,0 +1,166 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select, text
+
+from app.handler import card_handler
+from app.handler.card_handler import CardHandler
+from app.model.dao.deck_model_dao import Card, Deck
+from app.model.dto.request_model_dto import CreateCardDTO, ReviewResultDTO, UpdateCardDTO
+from app.services.resolution_cache_service import resolution_cache
+from app.services.resolution_service import DeckResolution, insert_cards, resolve_deck_cached
+from app.services.review_buffer_service import ReviewBuffer
+
+handler = CardHandler()
+
+
+class FakeDb:
+    async def commit(self) -> None:
+        pass
+
+    async def rollback(self) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def empty_resolution_cache():
+    resolution_cache.deck_ids.clear()
+    resolution_cache.sessions.clear()
+
+
+def create_card_dto(card_front: str = "front") -> CreateCardDTO:
+    return CreateCardDTO(card_front=card_front, card_back="back", last_learned="", next_learned="")
+
+
+def update_card_dto(card_uuid: str) -> UpdateCardDTO:
+    return UpdateCardDTO(card_uuid=card_uuid, card_front="new front", card_back="back", last_learned="", next_learned="", stage=1)
+
+
+def stale_then_fresh(monkeypatch, fresh: DeckResolution) -> list[str]:
+    refreshed = []
+
+    async def resolve_deck_cached(db, session_uuid, deck_name):
+        return DeckResolution(session_found=True, deck_id=1)
+
+    async def refresh_deck(db, session_uuid, deck_name):
+        refreshed.append(deck_name)
+        return fresh
+
+    monkeypatch.setattr(card_handler, "resolve_deck_cached", resolve_deck_cached)
+    monkeypatch.setattr(card_handler, "refresh_deck", refresh_deck)
+    return refreshed
+
+
+@pytest.mark.parametrize(
+    ("fresh", "status_code"),
+    [(DeckResolution(session_found=True, deck_id=None), 404), (DeckResolution(session_found=False, deck_id=None), 404)],
+)
+def test_bulk_update_of_a_deleted_deck_answers_404(monkeypatch, fresh, status_code):
+    refreshed = stale_then_fresh(monkeypatch, fresh)
+
+    async def update_cards(db, deck_id, cards):
+        return []
+
+    monkeypatch.setattr(card_handler, "update_cards", update_cards)
+
+    response = asyncio.run(handler.update_cards_handler(FakeDb(), "deck", "session", [update_card_dto("a")]))
+
+    assert response.status_code == status_code
+    assert refreshed == ["deck"]
+
+
+def test_bulk_delete_retries_with_the_fresh_deck_id(monkeypatch):
+    refreshed = stale_then_fresh(monkeypatch, DeckResolution(session_found=True, deck_id=2))
+    deck_ids = []
+
+    async def delete_cards(db, deck_id, card_uuids):
+        deck_ids.append(deck_id)
+        return set(card_uuids) if deck_id == 2 else set()
+
+    monkeypatch.setattr(card_handler, "delete_cards", delete_cards)
+
+    response = asyncio.run(handler.delete_cards_handler(FakeDb(), "deck", "session", ["a"]))
+
+    assert json.loads(response.body)["succeeded_count"] == 1
+    assert deck_ids == [1, 2]
+    assert refreshed == ["deck"]
+
+
+def test_bulk_delete_of_unknown_cards_does_not_retry_the_same_deck(monkeypatch):
+    stale_then_fresh(monkeypatch, DeckResolution(session_found=True, deck_id=1))
+    deck_ids = []
+
+    async def delete_cards(db, deck_id, card_uuids):
+        deck_ids.append(deck_id)
+        return set()
+
+    monkeypatch.setattr(card_handler, "delete_cards", delete_cards)
+
+    response = asyncio.run(handler.delete_cards_handler(FakeDb(), "deck", "session", ["a"]))
+
+    assert json.loads(response.body)["failed_count"] == 1
+    assert deck_ids == [1]
+
+
+def test_card_updates_drop_buffered_review_results_of_the_card(monkeypatch):
+    review_buffer = ReviewBuffer(flush_interval=60, max_pending=10, max_results=100)
+    monkeypatch.setattr(card_handler, "review_buffer", review_buffer)
+    for card_uuid in ("a", "b", "c"):
+        review_buffer.add("session", "deck", ReviewResultDTO(card_uuid=card_uuid, stage=1, last_learned="", next_learned=""))
+
+    async def update_card(db, session_uuid, deck_name, card_uuid, **values):
+        return SimpleNamespace(card_uuid=card_uuid, **values)
+
+    async def update_cards(db, deck_id, cards):
+        return []
+
+    monkeypatch.setattr(card_handler, "update_card", update_card)
+    monkeypatch.setattr(card_handler, "update_cards", update_cards)
+    stale_then_fresh(monkeypatch, DeckResolution(session_found=True, deck_id=1))
+
+    asyncio.run(handler.update_card_handler("session", "deck", FakeDb(), update_card_dto("a")))
+    asyncio.run(handler.update_cards_handler(FakeDb(), "deck", "session", [update_card_dto("b")]))
+
+    assert list(review_buffer.pending) == [("session", "deck", "c")]
+
+
+def test_bulk_create_after_the_deck_was_recreated_elsewhere(run_with_db):
+    async def test(db):
+        # Another worker deletes and recreates the deck while this one still has the old id cached
+        stale_deck_id = (await resolve_deck_cached(db, "session", "deck")).deck_id
+        await db.execute(text("DELETE FROM decks WHERE deck_name = 'deck'"))
+        await db.execute(text("INSERT INTO decks (deck_name, session_uuid) VALUES ('deck', 'session')"))
+        await db.commit()
+
+        response = await handler.create_cards_handler(db, "deck", "session", [create_card_dto("a"), create_card_dto("b")])
+        deck_id = await db.scalar(select(Deck.id).where(Deck.deck_name == "deck"))
+        card_deck_ids = set(await db.scalars(select(Card.deck_id)))
+        return stale_deck_id, response, deck_id, card_deck_ids
+
+    stale_deck_id, response, deck_id, card_deck_ids = run_with_db(test)
+
+    assert response.status_code == 200
+    assert json.loads(response.body)["succeeded_count"] == 2
+    assert deck_id != stale_deck_id
+    assert card_deck_ids == {deck_id}
+    assert resolution_cache.get_deck_id("session", "deck") == deck_id
+
+
+def test_bulk_update_after_the_deck_was_recreated_elsewhere(run_with_db):
+    async def test(db):
+        stale_deck_id = (await resolve_deck_cached(db, "session", "deck")).deck_id
+        await db.execute(text("DELETE FROM decks WHERE deck_name = 'deck'"))
+        await db.execute(text("INSERT INTO decks (deck_name, session_uuid) VALUES ('deck', 'session')"))
+        deck_id = await db.scalar(select(Deck.id).where(Deck.deck_name == "deck"))
+        await insert_cards(db, deck_id, [{"card_uuid": "a", "card_front": "front", "card_back": "back", "last_learned": "", "next_learned": ""}])
+        await db.commit()
+
+        response = await handler.update_cards_handler(db, "deck", "session", [update_card_dto("a")])
+        return stale_deck_id, deck_id, response
+
+    stale_deck_id, deck_id, response = run_with_db(test)
+
+    assert deck_id != stale_deck_id
+    assert json.loads(response.body)["results"][0]["card"]["card_front"] == "new front"
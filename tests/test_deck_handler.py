@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+from app.handler.deck_handler import DeckHandler
+from app.services.resolution_service import insert_card
+
+deck_handler = DeckHandler()
+
+
+def test_deck_read_answers_304_until_a_card_changes(run_with_db):
+    async def test(db):
+        await insert_card(db, "session", "deck", "a", "front", "back", "", "")
+        await db.commit()
+
+        first = await deck_handler.get_deck_handler(db, "deck", "session")
+        unchanged = await deck_handler.get_deck_handler(db, "deck", "session", if_none_match=first.headers["ETag"])
+
+        await insert_card(db, "session", "deck", "b", "front", "back", "", "")
+        await db.commit()
+        changed = await deck_handler.get_deck_handler(db, "deck", "session", if_none_match=first.headers["ETag"])
+        return first, unchanged, changed
+
+    first, unchanged, changed = run_with_db(test)
+
+    assert first.status_code == 200
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != first.headers["ETag"]
+
+
+def test_deck_pages_follow_the_cursor_and_keep_only_the_asked_fields(run_with_db):
+    async def test(db):
+        for card_uuid in ("a", "b", "c"):
+            await insert_card(db, "session", "deck", card_uuid, "front", "back", "", "")
+        await db.commit()
+
+        first_page = await deck_handler.get_deck_handler(db, "deck", "session", limit=2, fields="card_uuid")
+        cursor = json.loads(first_page.body)["next_cursor"]
+        last_page = await deck_handler.get_deck_handler(db, "deck", "session", after=cursor, limit=2, fields="card_uuid")
+        return json.loads(first_page.body), json.loads(last_page.body)
+
+    first_page, last_page = run_with_db(test)
+
+    assert first_page["cards"] == [{"card_uuid": "a"}, {"card_uuid": "b"}]
+    assert last_page["cards"] == [{"card_uuid": "c"}]
+    assert last_page["next_cursor"] is None
@@ -0,0 +1,146 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from app.model.dao.deck_model_dao import Card, Deck
+from app.services import deck_transfer_service
+from app.services.deck_transfer_service import (
+    DeckImportError, card_values, insert_card_batch, iter_csv_records, iter_lines, iter_ndjson_records
+)
+from tests.conftest import collect, stream
+
+IMPORTED_AT = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def lines_of(*chunks: bytes) -> list[str]:
+    return asyncio.run(collect(iter_lines(stream(*chunks))))
+
+
+def ndjson_records_of(*lines: str) -> list[dict]:
+    return asyncio.run(collect(iter_ndjson_records(stream(*lines))))
+
+
+def csv_records_of(*lines: str) -> list[dict]:
+    return asyncio.run(collect(iter_csv_records(stream(*lines))))
+
+
+def test_iter_lines_joins_lines_split_across_chunks():
+    assert lines_of(b"first\nsec", b"ond\n", b"last") == ["first\n", "second\n", "last"]
+
+
+def test_iter_lines_decodes_characters_split_across_chunks():
+    assert lines_of("caf".encode() + b"\xc3", b"\xa9\n") == ["café\n"]
+
+
+def test_iter_lines_rejects_invalid_utf8():
+    with pytest.raises(DeckImportError):
+        lines_of(b"valid\n", b"\xff\xfe\n")
+
+
+def test_iter_lines_measures_the_limit_in_bytes(monkeypatch):
+    monkeypatch.setattr(deck_transfer_service, "DECK_IMPORT_MAX_LINE_BYTES", 4)
+
+    assert lines_of("éé\n".encode()) == ["éé\n"]
+    with pytest.raises(DeckImportError):
+        lines_of("ééé\n".encode())
+    with pytest.raises(DeckImportError):
+        lines_of("ééé".encode())
+
+
+def test_iter_ndjson_records_skips_blank_lines():
+    assert ndjson_records_of('{"card_front": "a"}\n', "\n", '{"card_front": "b"}') == [
+        {"card_front": "a"}, {"card_front": "b"}
+    ]
+
+
+@pytest.mark.parametrize("line", ["{broken\n", "[1, 2]\n"])
+def test_iter_ndjson_records_rejects_lines_that_are_no_object(line):
+    with pytest.raises(DeckImportError, match="Line 2"):
+        ndjson_records_of('{"card_front": "a"}\n', line)
+
+
+def test_iter_csv_records_maps_rows_to_the_header():
+    assert csv_records_of("card_front,card_back\n", "a,b\n", "\n", "c,d") == [
+        {"card_front": "a", "card_back": "b"}, {"card_front": "c", "card_back": "d"}
+    ]
+
+
+def test_iter_csv_records_keeps_newlines_in_quoted_fields():
+    assert csv_records_of("card_front,card_back\n", '"multi\n', 'line",b\n') == [
+        {"card_front": "multi\nline", "card_back": "b"}
+    ]
+
+
+def test_iter_csv_records_rejects_an_unterminated_quote():
+    with pytest.raises(DeckImportError):
+        csv_records_of("card_front,card_back\n", '"open,b\n')
+
+
+def test_iter_csv_records_limits_multi_line_records(monkeypatch):
+    monkeypatch.setattr(deck_transfer_service, "DECK_IMPORT_MAX_LINE_BYTES", 8)
+
+    with pytest.raises(DeckImportError):
+        csv_records_of("card_front\n", '"12345\n', "67890\n", '"\n')
+
+
+def test_card_values_fills_in_missing_fields():
+    values = card_values({"card_front": "a", "stage": "2"}, 7, IMPORTED_AT)
+
+    assert values["deck_id"] == 7
+    assert values["card_uuid"]
+    assert values["card_back"] == ""
+    assert values["stage"] == 2
+    assert values["last_learned_at"] is None
+    assert values["next_due"] == IMPORTED_AT
+
+
+def test_card_values_parses_naive_timestamps_as_utc():
+    values = card_values({"next_due": "2024-05-01T10:00:00"}, 7, IMPORTED_AT)
+
+    assert values["next_due"] == datetime.datetime(2024, 5, 1, 10, tzinfo=datetime.timezone.utc)
+
+
+@pytest.mark.parametrize("card_uuid", [5, True, ["a"]])
+def test_card_values_rejects_a_card_uuid_that_is_no_string(card_uuid):
+    with pytest.raises(TypeError):
+        card_values({"card_uuid": card_uuid}, 7, IMPORTED_AT)
+
+
+def test_insert_card_batch_skips_cards_the_deck_already_has(run_with_db):
+    async def test(db):
+        deck_id = await db.scalar(select(Deck.id).where(Deck.deck_name == "deck"))
+        first_import = await insert_card_batch(db, [
+            card_values({"card_uuid": "a", "card_front": "first"}, deck_id, IMPORTED_AT),
+            card_values({"card_uuid": "b"}, deck_id, IMPORTED_AT),
+        ])
+        second_import = await insert_card_batch(db, [
+            card_values({"card_uuid": "a", "card_front": "second"}, deck_id, IMPORTED_AT),
+            card_values({"card_uuid": "c"}, deck_id, IMPORTED_AT),
+        ])
+        card_fronts = dict((await db.execute(select(Card.card_uuid, Card.card_front))).all())
+        return first_import, second_import, card_fronts
+
+    first_import, second_import, card_fronts = run_with_db(test)
+
+    assert (first_import, second_import) == (2, 1)
+    assert card_fronts == {"a": "first", "b": "", "c": ""}
+
+
+def test_insert_card_batch_schedules_cards_by_their_string_columns(run_with_db):
+    async def test(db):
+        deck_id = await db.scalar(select(Deck.id).where(Deck.deck_name == "deck"))
+        await insert_card_batch(db, [
+            card_values({"card_uuid": "a", "last_learned": "2024-05-01T10:00:00+00:00", "next_learned": "2999-01-01T00:00:00+00:00"}, deck_id, IMPORTED_AT),
+            card_values({"card_uuid": "b", "next_learned": "not a date"}, deck_id, IMPORTED_AT),
+        ])
+        return dict((await db.execute(select(Card.card_uuid, Card.next_due))).all()), await db.scalar(
+            select(Card.last_learned_at).where(Card.card_uuid == "a")
+        )
+
+    next_dues, last_learned_at = run_with_db(test)
+
+    assert next_dues["a"].isoformat() == "2999-01-01T00:00:00+00:00"
+    assert next_dues["b"] == IMPORTED_AT
+    assert last_learned_at.isoformat() == "2024-05-01T10:00:00+00:00"
@@ -0,0 +1,43 @@
+import base64
+import os
+
+from app.model.dto.request_model_dto import CustomFileModel
+from app.services.file_store_service import FileStoreService
+
+
+def text_file(content: bytes) -> CustomFileModel:
+    return CustomFileModel(file_content=base64.b64encode(content).decode(), file_type="text/plain")
+
+
+def test_get_drops_the_reference_to_an_evicted_body(tmp_path):
+    file_store = FileStoreService(str(tmp_path), max_bytes=1024, ttl=60, max_references=10)
+    stored_file = file_store.put("deck", text_file(b"content"))
+    assert file_store.get("deck") == stored_file
+
+    os.remove(file_store.body_path(stored_file))
+
+    assert file_store.get("deck") is None
+    assert file_store.was_evicted("deck")
+    assert "deck" not in file_store.references
+
+
+def test_uploading_the_file_again_clears_the_eviction(tmp_path):
+    file_store = FileStoreService(str(tmp_path), max_bytes=1024, ttl=60, max_references=10)
+    os.remove(file_store.body_path(file_store.put("deck", text_file(b"content"))))
+    file_store.get("deck")
+
+    stored_file = file_store.put("deck", text_file(b"content"))
+
+    assert file_store.get("deck") == stored_file
+    assert not file_store.was_evicted("deck")
+
+
+def test_put_evicts_the_oldest_bodies_above_the_budget(tmp_path):
+    file_store = FileStoreService(str(tmp_path), max_bytes=10, ttl=60, max_references=10)
+    old_file = file_store.put("old deck", text_file(b"12345678"))
+    os.utime(file_store.body_path(old_file), (0, 0))
+    file_store.put("new deck", text_file(b"abcdefgh"))
+
+    assert file_store.get("old deck") is None
+    assert file_store.was_evicted("old deck")
+    assert file_store.get("new deck") is not None
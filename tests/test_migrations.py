@@ -0,0 +1,75 @@
+import datetime
+
+from sqlalchemy import text
+
+from app.migrations import MIGRATIONS
+from app.services.migration_service import apply_migrations
+
+
+def deck_version(connection) -> int:
+    return connection.scalar(text("SELECT version FROM decks WHERE deck_name = 'deck'"))
+
+
+def test_migrations_are_recorded_and_applied_only_once(migrated_engine):
+    apply_migrations(migrated_engine)
+
+    with migrated_engine.connect() as connection:
+        versions = list(connection.scalars(text("SELECT version FROM schema_migrations ORDER BY version")))
+
+    assert versions == [migration.VERSION for migration in MIGRATIONS]
+
+
+def test_cards_get_defaults_for_the_legacy_columns(migrated_engine):
+    with migrated_engine.begin() as connection:
+        card = connection.execute(text(
+            """
+            INSERT INTO cards (card_uuid, card_front, card_back, deck_id)
+            SELECT 'card', 'front', 'back', id FROM decks WHERE deck_name = 'deck'
+            RETURNING last_learned, next_learned, stage, next_due
+            """
+        )).one()
+
+    assert (card.last_learned, card.next_learned, card.stage) == ("", "", 0)
+    assert card.next_due is not None
+
+
+def test_try_timestamptz_returns_null_for_anything_that_is_no_timestamp(migrated_engine):
+    with migrated_engine.connect() as connection:
+        parsed = connection.scalar(text("SELECT try_timestamptz('2024-05-01T10:00:00+00:00')"))
+        invalid = connection.scalar(text("SELECT try_timestamptz('next tuesday-ish')"))
+        empty = connection.scalar(text("SELECT try_timestamptz('')"))
+
+    assert parsed == datetime.datetime(2024, 5, 1, 10, tzinfo=datetime.timezone.utc)
+    assert invalid is None
+    assert empty is None
+
+
+def test_card_writes_bump_the_deck_version_once_per_statement(migrated_engine):
+    with migrated_engine.begin() as connection:
+        initial_version = deck_version(connection)
+
+        connection.execute(text(
+            """
+            INSERT INTO cards (card_uuid, card_front, card_back, deck_id, last_learned, next_learned, stage)
+            SELECT card_uuid, 'front', 'back', decks.id, '', '', 0
+            FROM decks, (VALUES ('a'), ('b'), ('c')) AS card_uuids (card_uuid)
+            WHERE deck_name = 'deck'
+            """
+        ))
+        after_insert = deck_version(connection)
+
+        connection.execute(text("UPDATE cards SET stage = 1"))
+        after_update = deck_version(connection)
+
+        connection.execute(text("DELETE FROM cards WHERE card_uuid IN ('a', 'b')"))
+        after_delete = deck_version(connection)
+
+    assert (after_insert, after_update, after_delete) == (initial_version + 1, initial_version + 2, initial_version + 3)
+
+
+def test_statements_that_touch_no_card_leave_the_version_alone(migrated_engine):
+    with migrated_engine.begin() as connection:
+        initial_version = deck_version(connection)
+        connection.execute(text("UPDATE cards SET stage = 1 WHERE card_uuid = 'missing'"))
+
+        assert deck_version(connection) == initial_version
@@ -0,0 +1,108 @@
+from sqlalchemy import func, select
+
+from app.model.dao.deck_model_dao import Card, Deck
+from app.services.resolution_service import (
+    delete_cards, delete_deck, insert_card, insert_cards, resolve_deck, update_card, update_cards
+)
+
+
+async def deck_id_of(db, deck_name: str = "deck") -> int:
+    return await db.scalar(select(Deck.id).where(Deck.deck_name == deck_name))
+
+
+def test_resolve_deck_tells_a_missing_session_from_a_missing_deck(run_with_db):
+    async def test(db):
+        return (
+            await resolve_deck(db, "missing", "deck"),
+            await resolve_deck(db, "session", "missing"),
+            await resolve_deck(db, "session", "deck"),
+            await deck_id_of(db),
+        )
+
+    missing_session, missing_deck, found, deck_id = run_with_db(test)
+
+    assert (missing_session.session_found, missing_session.deck_id) == (False, None)
+    assert (missing_deck.session_found, missing_deck.deck_id) == (True, None)
+    assert (found.session_found, found.deck_id, found.version) == (True, deck_id, 0)
+
+
+def test_single_card_writes_resolve_the_deck_in_the_same_statement(run_with_db):
+    async def test(db):
+        missing = await insert_card(db, "session", "missing", "card", "front", "back", "", "")
+        card = await insert_card(db, "session", "deck", "card", "front", "back", "", "")
+        updated = await update_card(
+            db, "session", "deck", "card",
+            card_front="new front", card_back="back", last_learned="", next_learned="2024-05-01T10:00:00+00:00", stage=2,
+        )
+        next_due = await db.scalar(select(Card.next_due).where(Card.card_uuid == "card"))
+        return missing, card, updated, next_due
+
+    missing, card, updated, next_due = run_with_db(test)
+
+    assert missing is None
+    assert (card.card_uuid, card.stage) == ("card", 0)
+    assert (updated.card_front, updated.stage) == ("new front", 2)
+    assert next_due.isoformat() == "2024-05-01T10:00:00+00:00"
+
+
+def test_delete_deck_removes_the_deck_and_its_cards_in_one_statement(run_with_db):
+    async def test(db):
+        await insert_card(db, "session", "deck", "card", "front", "back", "", "")
+        deleted = await delete_deck(db, "session", "deck")
+        deleted_again = await delete_deck(db, "session", "deck")
+        await db.commit()
+        return deleted, deleted_again, await db.scalar(select(func.count()).select_from(Card)), await deck_id_of(db)
+
+    deleted, deleted_again, card_count, deck_id = run_with_db(test)
+
+    assert (deleted, deleted_again) == (True, False)
+    assert card_count == 0
+    assert deck_id is None
+
+
+def card_row(card_uuid: str, **values) -> dict:
+    return {"card_uuid": card_uuid, "card_front": "front", "card_back": "back", "last_learned": "", "next_learned": "", **values}
+
+
+def test_insert_cards_returns_the_cards_in_the_given_order(run_with_db):
+    async def test(db):
+        return await insert_cards(db, await deck_id_of(db), [card_row(card_uuid) for card_uuid in ("c", "a", "b")])
+
+    new_cards = run_with_db(test)
+
+    assert [new_card.card_uuid for new_card in new_cards] == ["c", "a", "b"]
+    assert all(new_card.stage == 0 for new_card in new_cards)
+
+
+def test_update_cards_updates_only_matching_cards_of_the_deck(run_with_db):
+    async def test(db):
+        deck_id = await deck_id_of(db)
+        await insert_cards(db, deck_id, [card_row("a"), card_row("b")])
+        updated_cards = await update_cards(db, deck_id, [
+            card_row("a", card_front="new a", stage=1, next_learned="2024-05-01T10:00:00+00:00"),
+            card_row("missing", stage=1),
+        ])
+        other_deck_updates = await update_cards(db, deck_id + 1, [card_row("b", stage=1)])
+        cards = (await db.execute(select(Card.card_uuid, Card.card_front, Card.stage, Card.next_due).order_by(Card.card_uuid))).all()
+        return updated_cards, other_deck_updates, cards
+
+    updated_cards, other_deck_updates, cards = run_with_db(test)
+
+    assert [(card.card_uuid, card.card_front, card.stage) for card in updated_cards] == [("a", "new a", 1)]
+    assert other_deck_updates == []
+    assert [(card.card_uuid, card.card_front, card.stage) for card in cards] == [("a", "new a", 1), ("b", "front", 0)]
+    assert cards[0].next_due.isoformat() == "2024-05-01T10:00:00+00:00"
+
+
+def test_delete_cards_returns_the_uuids_it_deleted(run_with_db):
+    async def test(db):
+        deck_id = await deck_id_of(db)
+        await insert_cards(db, deck_id, [card_row("a"), card_row("b"), card_row("c")])
+        deleted_card_uuids = await delete_cards(db, deck_id, ["a", "c", "missing"])
+        remaining = list(await db.scalars(select(Card.card_uuid)))
+        return deleted_card_uuids, remaining
+
+    deleted_card_uuids, remaining = run_with_db(test)
+
+    assert deleted_card_uuids == {"a", "c"}
+    assert remaining == ["b"]
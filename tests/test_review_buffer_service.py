@@ -0,0 +1,213 @@
+import asyncio
+
+import pytest
+
+from app.model.dto.request_model_dto import ReviewResultDTO
+from app.services import review_buffer_service
+from app.services.review_buffer_service import ReviewBuffer
+
+
+class FakeSession:
+    def __init__(self, writer: "FakeWriter"):
+        self.writer = writer
+
+    async def __aenter__(self) -> "FakeSession":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    async def commit(self) -> None:
+        self.writer.committed.extend(self.writer.uncommitted)
+        self.writer.uncommitted = []
+
+
+class FakeWriter:
+    def __init__(self, fail_on_statement: int = 0, missing_cards: frozenset = frozenset()):
+        self.statements: list[list[tuple]] = []
+        self.uncommitted: list[tuple] = []
+        self.committed: list[tuple] = []
+        self.fail_on_statement = fail_on_statement
+        self.missing_cards = missing_cards
+
+    def session(self) -> FakeSession:
+        return FakeSession(self)
+
+    async def apply_review_results(self, db: FakeSession, review_results: list[tuple]) -> list[tuple]:
+        self.statements.append(review_results)
+        if len(self.statements) == self.fail_on_statement:
+            raise ConnectionError("database is down")
+        updated = [review_result for review_result in review_results if review_result[2] not in self.missing_cards]
+        self.uncommitted.extend(updated)
+        return updated
+
+
+@pytest.fixture
+def writer(monkeypatch) -> FakeWriter:
+    writer = FakeWriter()
+    monkeypatch.setattr(review_buffer_service, "AsyncSessionLocal", writer.session)
+    monkeypatch.setattr(review_buffer_service, "apply_review_results", writer.apply_review_results)
+    return writer
+
+
+def review_result(card_uuid: str, stage: int = 1) -> ReviewResultDTO:
+    return ReviewResultDTO(card_uuid=card_uuid, stage=stage, last_learned="", next_learned="")
+
+
+def test_flush_writes_statements_of_at_most_max_pending_rows(writer):
+    async def main():
+        # Lowered after construction, so adding the results does not start size triggered flushes already
+        review_buffer = ReviewBuffer(flush_interval=60, max_pending=1000, max_results=10000)
+        review_buffer.max_pending = 3
+        for i in range(8):
+            review_buffer.add("session", "deck", review_result(str(i)))
+        await review_buffer.flush()
+        return review_buffer
+
+    review_buffer = asyncio.run(main())
+
+    assert [len(statement) for statement in writer.statements] == [3, 3, 2]
+    assert len(writer.committed) == 8
+    assert review_buffer.stats()["pending"] == 0
+    assert review_buffer.stats()["flushed"] == 8
+
+
+def test_flush_keeps_only_the_newest_result_of_a_card(writer):
+    async def main():
+        review_buffer = ReviewBuffer(flush_interval=60, max_pending=10, max_results=100)
+        review_buffer.add("session", "deck", review_result("card", stage=1))
+        review_buffer.add("session", "deck", review_result("card", stage=2))
+        await review_buffer.flush()
+
+    asyncio.run(main())
+
+    assert writer.committed == [("session", "deck", "card", 2, "", "")]
+
+
+def test_failed_flush_merges_back_only_the_uncommitted_rows(writer):
+    writer.fail_on_statement = 2
+
+    async def main():
+        review_buffer = ReviewBuffer(flush_interval=60, max_pending=1000, max_results=100)
+        review_buffer.max_pending = 2
+        for i in range(5):
+            review_buffer.add("session", "deck", review_result(str(i)))
+
+        await review_buffer.flush()
+        pending_after_failure = set(card_uuid for _, _, card_uuid in review_buffer.pending)
+        await review_buffer.flush()
+        return review_buffer, pending_after_failure
+
+    review_buffer, pending_after_failure = asyncio.run(main())
+
+    assert pending_after_failure == {"2", "3", "4"}
+    assert sorted(card_uuid for _, _, card_uuid, *_ in writer.committed) == ["0", "1", "2", "3", "4"]
+    assert review_buffer.stats()["failures"] == 1
+    assert review_buffer.stats()["pending"] == 0
+
+
+def test_newer_results_win_over_merged_back_ones(writer):
+    writer.fail_on_statement = 1
+
+    async def main():
+        review_buffer = ReviewBuffer(flush_interval=60, max_pending=10, max_results=100)
+        review_buffer.add("session", "deck", review_result("card", stage=1))
+        flush = asyncio.create_task(review_buffer.flush())
+        # The result arrives while the failing batch is being written
+        review_buffer.add("session", "deck", review_result("card", stage=3))
+        await flush
+        return review_buffer
+
+    review_buffer = asyncio.run(main())
+
+    assert review_buffer.pending[("session", "deck", "card")].stage == 3
+
+
+def test_results_of_missing_cards_are_counted_as_dropped(writer):
+    writer.missing_cards = frozenset({"gone"})
+
+    async def main():
+        review_buffer = ReviewBuffer(flush_interval=60, max_pending=10, max_results=100)
+        review_buffer.add("session", "deck", review_result("card"))
+        review_buffer.add("session", "deck", review_result("gone"))
+        await review_buffer.flush()
+        return review_buffer
+
+    review_buffer = asyncio.run(main())
+
+    assert review_buffer.stats()["flushed"] == 1
+    assert review_buffer.stats()["dropped"] == 1
+
+
+def test_add_refuses_new_cards_once_the_buffer_is_full(writer):
+    async def main():
+        review_buffer = ReviewBuffer(flush_interval=60, max_pending=10, max_results=2)
+        accepted = [review_buffer.add("session", "deck", review_result(card_uuid)) for card_uuid in ("a", "b", "c")]
+        # A card that is already buffered only replaces its result
+        accepted.append(review_buffer.add("session", "deck", review_result("a", stage=2)))
+        return review_buffer, accepted
+
+    review_buffer, accepted = asyncio.run(main())
+
+    assert accepted == [True, True, False, True]
+    assert review_buffer.stats()["rejected"] == 1
+    assert review_buffer.stats()["pending"] == 2
+
+
+def test_discard_drops_the_buffered_result_of_a_directly_written_card(writer):
+    async def main():
+        review_buffer = ReviewBuffer(flush_interval=60, max_pending=10, max_results=100)
+        review_buffer.add("session", "deck", review_result("card", stage=1))
+        review_buffer.add("session", "deck", review_result("other", stage=1))
+        # PUT /card writes the card directly, the older buffered result must not overwrite it afterwards
+        await review_buffer.discard("session", "deck", ["card"])
+        await review_buffer.flush()
+
+    asyncio.run(main())
+
+    assert writer.committed == [("session", "deck", "other", 1, "", "")]
+
+
+def test_discard_waits_for_a_failing_flush_that_merges_the_card_back(writer):
+    writer.fail_on_statement = 1
+
+    async def main():
+        review_buffer = ReviewBuffer(flush_interval=60, max_pending=10, max_results=100)
+        review_buffer.add("session", "deck", review_result("card", stage=1))
+        flush = asyncio.create_task(review_buffer.flush())
+        await asyncio.sleep(0)
+        # The card is only in the batch being written when the direct write discards it
+        await review_buffer.discard("session", "deck", ["card"])
+        await flush
+        return review_buffer
+
+    review_buffer = asyncio.run(main())
+
+    assert review_buffer.stats()["failures"] == 1
+    assert review_buffer.pending == {}
+
+
+def test_flush_of_a_deck_writes_only_its_results(writer):
+    async def main():
+        review_buffer = ReviewBuffer(flush_interval=60, max_pending=10, max_results=100)
+        review_buffer.add("session", "deck", review_result("a"))
+        review_buffer.add("session", "other deck", review_result("b"))
+        review_buffer.add("other session", "deck", review_result("c"))
+        await review_buffer.flush("session", "deck")
+        return review_buffer
+
+    review_buffer = asyncio.run(main())
+
+    assert writer.committed == [("session", "deck", "a", 1, "", "")]
+    assert set(review_buffer.pending) == {("session", "other deck", "b"), ("other session", "deck", "c")}
+
+
+def test_flush_of_an_empty_buffer_does_not_wait_for_the_lock(writer):
+    async def main():
+        review_buffer = ReviewBuffer(flush_interval=60, max_pending=10, max_results=100)
+        async with review_buffer.flush_lock:
+            await asyncio.wait_for(review_buffer.flush("session", "deck"), timeout=1)
+
+    asyncio.run(main())
+
+    assert writer.statements == []
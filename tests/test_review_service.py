@@ -0,0 +1,82 @@
+import datetime
+
+from sqlalchemy import select
+
+from app.config.card_config import REVIEW_INTERVAL_DAYS
+from app.model.dao.deck_model_dao import Card, Deck
+from app.services.resolution_service import insert_card, insert_cards, update_card
+from app.services.review_service import apply_review_results, review_card, select_due_cards
+
+
+def test_due_cards_come_oldest_first_and_skip_cards_due_later(run_with_db):
+    async def test(db):
+        for card_uuid, next_learned in (
+            ("later", "2999-01-01T00:00:00+00:00"), ("old", "2001-01-01T00:00:00+00:00"), ("older", "2000-01-01T00:00:00+00:00")
+        ):
+            await insert_card(db, "session", "deck", card_uuid, "front", "back", "", "")
+            await update_card(
+                db, "session", "deck", card_uuid,
+                card_front="front", card_back="back", last_learned="", next_learned=next_learned, stage=1,
+            )
+        return (
+            await select_due_cards(db, "session", "deck", 10),
+            await select_due_cards(db, "session", None, 1),
+            await select_due_cards(db, "session", "missing", 10),
+        )
+
+    due_cards, first_due_card, missing_deck = run_with_db(test)
+
+    assert [due_card.card_uuid for due_card in due_cards] == ["older", "old"]
+    assert [due_card.card_uuid for due_card in first_due_card] == ["older"]
+    assert missing_deck == []
+
+
+def test_cards_created_with_a_future_schedule_are_not_due_yet(run_with_db):
+    async def test(db):
+        await insert_card(db, "session", "deck", "future", "front", "back", "", "2999-01-01T00:00:00+00:00")
+        await insert_cards(db, await db.scalar(select(Deck.id)), [
+            {"card_uuid": "imported", "card_front": "front", "card_back": "back", "last_learned": "", "next_learned": "2999-01-01T00:00:00+00:00"},
+            {"card_uuid": "unscheduled", "card_front": "front", "card_back": "back", "last_learned": "", "next_learned": "not a date"},
+        ])
+        return await select_due_cards(db, "session", "deck", 10)
+
+    due_cards = run_with_db(test)
+
+    assert [due_card.card_uuid for due_card in due_cards] == ["unscheduled"]
+
+
+def test_review_card_moves_the_card_between_boxes(run_with_db):
+    async def test(db):
+        await insert_card(db, "session", "deck", "card", "front", "back", "", "")
+        correct = await review_card(db, "session", "deck", "card", correct=True)
+        wrong = await review_card(db, "session", "deck", "card", correct=False)
+        missing = await review_card(db, "session", "deck", "missing", correct=True)
+        return correct, wrong, missing
+
+    correct, wrong, missing = run_with_db(test)
+
+    assert correct.stage == 1
+    assert correct.next_due - correct.last_learned_at == datetime.timedelta(days=REVIEW_INTERVAL_DAYS[1])
+    assert wrong.stage == 0
+    assert missing is None
+
+
+def test_apply_review_results_writes_only_cards_of_the_named_decks(run_with_db):
+    async def test(db):
+        await insert_card(db, "session", "deck", "card", "front", "back", "", "")
+        updated_cards = await apply_review_results(db, [
+            ("session", "deck", "card", 3, "2024-05-01T10:00:00+00:00", "not a date"),
+            ("session", "other deck", "card", 5, "", ""),
+            ("other session", "deck", "card", 5, "", ""),
+        ])
+        card = (await db.execute(select(Card.stage, Card.last_learned_at, Card.next_learned, Card.next_due))).one()
+        return updated_cards, card
+
+    updated_cards, card = run_with_db(test)
+
+    assert [(updated_card.card_uuid, updated_card.stage) for updated_card in updated_cards] == [("card", 3)]
+    assert card.stage == 3
+    assert card.last_learned_at.isoformat() == "2024-05-01T10:00:00+00:00"
+    # A next date that is no timestamp keeps the previous schedule
+    assert card.next_learned == "not a date"
+    assert card.next_due is not None